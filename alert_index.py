@@ -0,0 +1,108 @@
+from bisect import bisect_left, bisect_right, insort
+
+_LOW = float('-inf')
+_HIGH = float('inf')
+
+
+class AlertIndex:
+    """按股票索引所有交易的卖出和买入目标价格
+
+    每支股票保存两个按价格排序的列表 [(目标价格, 交易ID)]。新价格到来时用二分查找
+    取出上一个价格到新价格之间被穿越的目标：价格上涨穿过的卖出目标、价格下跌穿过的买入目标，
+    耗时只与被穿越的目标数量有关。交易添加、修改、关闭时增量更新，新加入的目标立即与
+    当前价格比较，已经越过的目标由 add 返回。
+    """
+
+    def __init__(self):
+        self._sell = {}     # 股票代码 -> [(卖出目标, 交易ID)]
+        self._buy = {}      # 股票代码 -> [(买入目标, 交易ID)]
+        self._entries = {}  # 交易ID -> (股票代码, 卖出目标, 买入目标)
+        self._last = {}     # 股票代码 -> 上一个价格
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, trade_id):
+        return trade_id in self._entries
+
+    def add(self, trade_id, stock_code, sell_target, buy_target):
+        """添加交易，已存在时按新的目标价格更新
+
+        返回 (是否已达到卖出目标, 是否已达到买入目标)，还没有该股票的价格时都为 False。
+        """
+        if self._entries.get(trade_id) == (stock_code, sell_target, buy_target):
+            return False, False
+        self.remove(trade_id)
+        self._entries[trade_id] = (stock_code, sell_target, buy_target)
+        if sell_target is not None:
+            insort(self._sell.setdefault(stock_code, []), (sell_target, trade_id))
+        if buy_target is not None:
+            insort(self._buy.setdefault(stock_code, []), (buy_target, trade_id))
+        # 新目标可能已经被当前价格越过，之后价格不变时不会再被穿越，加入时直接判断
+        price = self._last.get(stock_code)
+        if price is None:
+            return False, False
+        return (sell_target is not None and price >= sell_target,
+                buy_target is not None and price <= buy_target)
+
+    def remove(self, trade_id):
+        entry = self._entries.pop(trade_id, None)
+        if entry is None:
+            return
+        stock_code, sell_target, buy_target = entry
+        for levels, target in ((self._sell, sell_target), (self._buy, buy_target)):
+            if target is None:
+                continue
+            items = levels[stock_code]
+            del items[bisect_left(items, (target, trade_id))]
+            if not items:
+                del levels[stock_code]
+
+    def apply(self, trades, removed=()):
+        """增量更新：添加或修改交易 [(交易ID, 股票代码, 卖出目标, 买入目标)]，移除 removed 中的交易ID
+
+        返回新加入或修改后已达到目标的交易 {股票代码: (卖出交易ID, 买入交易ID)}。
+        """
+        for trade_id in removed:
+            self.remove(trade_id)
+        hits = {}
+        for trade_id, stock_code, sell_target, buy_target in trades:
+            sell_hit, buy_hit = self.add(trade_id, stock_code, sell_target, buy_target)
+            if sell_hit or buy_hit:
+                sell_ids, buy_ids = hits.setdefault(stock_code, ([], []))
+                (sell_ids if sell_hit else buy_ids).append(trade_id)
+        return hits
+
+    def sync(self, trades):
+        """与当前活跃交易保持一致，只更新有变化的交易，返回值同 apply"""
+        trades = list(trades)
+        current = {trade[0] for trade in trades}
+        return self.apply(trades, [trade_id for trade_id in self._entries if trade_id not in current])
+
+    def update(self, stock_code, price):
+        """记录新价格，返回 (达到卖出目标的交易ID, 达到买入目标的交易ID)
+
+        第一次收到某支股票的价格时，所有已达到的目标都算作触发。
+        """
+        previous = self._last.get(stock_code)
+        self._last[stock_code] = price
+        sell = self._sell.get(stock_code, [])
+        buy = self._buy.get(stock_code, [])
+        if previous is None:
+            sell_hits = sell[:bisect_right(sell, (price, _HIGH))]
+            buy_hits = buy[bisect_left(buy, (price, _LOW)):]
+        else:
+            # 上涨穿过的卖出目标：previous < 目标 <= price
+            sell_hits = sell[bisect_right(sell, (previous, _HIGH)):bisect_right(sell, (price, _HIGH))]
+            # 下跌穿过的买入目标：price <= 目标 < previous
+            buy_hits = buy[bisect_left(buy, (price, _LOW)):bisect_left(buy, (previous, _LOW))]
+        return [trade_id for _, trade_id in sell_hits], [trade_id for _, trade_id in buy_hits]
+
+    def nearest(self, stock_code, price):
+        """价格上方最近的卖出目标和下方最近的买入目标，没有时为 None"""
+        sell = self._sell.get(stock_code, [])
+        buy = self._buy.get(stock_code, [])
+        i = bisect_left(sell, (price, _LOW))
+        j = bisect_right(buy, (price, _HIGH))
+        return (sell[i][0] if i < len(sell) else None,
+                buy[j - 1][0] if j > 0 else None)
@@ -0,0 +1,93 @@
+"""对比冷连接与长连接池的单次请求延迟
+
+在本地启动一个模拟腾讯行情接口的HTTP服务器，每个新连接建立时人为延迟
+--handshake-ms 毫秒以模拟公网TCP+TLS握手的往返开销，然后分别测量：
+  cold: 每次请求都使用 requests.get（新建连接）
+  warm: 使用 ProviderHttpPool（复用长连接）
+
+用法：python benchmarks/bench_http_pool.py --requests 200 --handshake-ms 30
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from http_pool import ProviderHttpPool
+
+PAYLOAD = 'v_sh600000="1~浦发银行~600000~7.50~7.48~7.49~120000~60000~60000";\n'.encode('gbk')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持keep-alive
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=GBK')
+        self.send_header('Content-Length', str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    handshake_delay = 0.0
+
+    def verify_request(self, request, client_address):
+        # 每个新连接调用一次，用来模拟握手开销
+        time.sleep(self.handshake_delay)
+        return True
+
+
+def measure(fetch, url, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = fetch(url)
+        response.content
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<6} 平均 {statistics.mean(latencies):7.2f} ms  "
+          f"中位数 {statistics.median(latencies):7.2f} ms  p95 {p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help='每种模式的请求次数')
+    parser.add_argument('--handshake-ms', type=float, default=30, help='模拟的新连接握手延迟(毫秒)')
+    args = parser.parse_args()
+
+    server = StubServer(('127.0.0.1', 0), StubHandler)
+    server.handshake_delay = args.handshake_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/q=sh600000"
+
+    pool = ProviderHttpPool()
+    try:
+        cold = measure(lambda u: requests.get(u, timeout=5), url, args.requests)
+        warm = measure(lambda u: pool.get('tencent', u), url, args.requests)
+    finally:
+        pool.close()
+        server.shutdown()
+
+    print(f"请求次数: {args.requests}，模拟握手延迟: {args.handshake_ms} ms")
+    report('cold', cold)
+    report('warm', warm)
+
+
+if __name__ == '__main__':
+    main()
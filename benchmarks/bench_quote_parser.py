@@ -0,0 +1,69 @@
+"""对比正则拆分与字节解析器解析批量行情的耗时
+
+使用 benchmarks/fixtures 下按接口格式生成的60只股票批量行情（GBK编码的合成数据，不是录制的真实响应）：
+  regex: 解码整个响应后用正则取出每行，再按分隔符拆分整行（原实现）
+  bytes: quote_parser 在原始字节上定位字段，只转换价格等少数字段
+  bytes+name: 同上，并保留股票名称，访问时才解码
+  bytes+names: 同上，并解码全部股票名称
+
+用法：python benchmarks/bench_quote_parser.py --repeat 2000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from quote_parser import parse_tencent, parse_sina
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+TENCENT_PATTERN = re.compile(r'v_(\w+)="([^"]*)"')
+SINA_PATTERN = re.compile(r'hq_str_(\w+)="([^"]*)"')
+
+
+def regex_parser(pattern, sep):
+    def parse(payload):
+        result = {}
+        for code, line in pattern.findall(payload.decode('gbk')):
+            data = line.split(sep)
+            if len(data) > 3:
+                result[code] = (float(data[3]), len(data[3].split('.')[1]) if '.' in data[3] else 0)
+        return result
+    return parse
+
+
+def bench(parse, payload, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(payload)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000, help='每种解析方式的重复次数')
+    args = parser.parse_args()
+
+    cases = [
+        ('tencent', 'tencent_quotes.txt', regex_parser(TENCENT_PATTERN, '~'), parse_tencent),
+        ('sina', 'sina_quotes.txt', regex_parser(SINA_PATTERN, ','), parse_sina),
+    ]
+    for name, filename, old, new in cases:
+        with open(os.path.join(FIXTURES, filename), 'rb') as f:
+            payload = f.read()
+        # 两种方式的价格结果必须一致
+        expected = old(payload)
+        actual = {q.code: (q.price, q.precision) for q in new(payload)}
+        assert actual == expected, f"{name} 解析结果不一致"
+
+        print(f"{name}: {len(expected)} 只股票，{len(payload)} 字节")
+        print(f"  regex      {bench(old, payload, args.repeat):8.1f} us/次")
+        print(f"  bytes      {bench(new, payload, args.repeat):8.1f} us/次")
+        print(f"  bytes+name {bench(lambda p: new(p, with_name=True), payload, args.repeat):8.1f} us/次")
+        decode_all = lambda p: [q.name for q in new(p, with_name=True)]
+        print(f"  bytes+names{bench(decode_all, payload, args.repeat):8.1f} us/次")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""行情路径性能测试
+
+在进程内启动回放服务器（benchmarks/replay_server.py），StockService 的请求全部
+发往回放服务器，分场景统计 p50/p95/p99 延迟和吞吐量：
+  single:   get_realtime_price 单只股票
+  batched:  get_realtime_quotes 批量股票
+  fallback: 主行情源（腾讯）始终返回错误时的 get_realtime_price
+  info:     get_stock_info（关闭缓存时跳过股票信息缓存，每次都访问行情源）
+  search:   search_stocks（不使用本地代码表）
+  kline:    从行情源获取日K线（get_historical_data 中访问网络的部分）
+
+每次调用的结果与录制数据对比，价格、价格精度、名称或K线不一致时记为失败。
+默认关闭实时行情缓存和股票信息缓存，每次调用都会发出请求。--json 保存结果，--compare 与之前
+保存的结果对比，便于比较修改前后的性能。
+
+用法：python benchmarks/bench_quote_path.py --requests 200 --concurrency 4 --latency-ms 20
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from replay_server import ReplayServer, Recordings, DEFAULT_RECORDINGS
+from provider_health import ProviderRegistry
+from quote_parser import parse_tencent, parse_sina
+
+SCENARIOS = ['single', 'batched', 'fallback', 'info', 'search', 'kline']
+
+
+def percentile(sorted_values, ratio):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * ratio))]
+
+
+def run(op, count, concurrency):
+    """并发执行 count 次 op(i)，返回 (每次耗时毫秒, 失败次数, 总耗时秒)"""
+    latencies = []
+    errors = [0]
+    next_index = [0]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next_index[0]
+                next_index[0] += 1
+            if i >= count:
+                return
+            start = time.perf_counter()
+            try:
+                ok = op(i)
+            except Exception:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - start
+
+
+def summarize(latencies, errors, wall):
+    latencies = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'errors': errors,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'throughput': len(latencies) / wall if wall else 0.0
+    }
+
+
+def build_service(server_url, workdir, cache):
+    os.environ['QUOTE_REPLAY_URL'] = server_url
+    # 默认不限速，只测量行情路径本身
+    os.environ.setdefault('RATE_LIMIT_RATE', '0')
+    os.environ['KLINE_STORE_DIR'] = os.path.join(workdir, 'kline_data')
+    os.environ['INSTRUMENT_MASTER_PATH'] = os.path.join(workdir, 'instruments.json')
+    # 股票信息缓存的数据库建在临时目录中
+    os.environ['TRADE_DB_URL'] = f"sqlite:///{os.path.join(workdir, 'trades.db')}"
+    from stock_service import StockService
+    from quote_cache import QuoteCache
+    service = StockService()
+    if not cache:
+        service.quote_cache = QuoteCache(max_size=0)
+    return service
+
+
+def expected_quotes(recordings):
+    """录制的行情，返回 {ts_code: {行情源: (价格, 价格精度, 名称)}}"""
+    expected = {}
+    for provider, host, parse in (('tencent', 'qt.gtimg.cn', parse_tencent), ('sina', 'hq.sinajs.cn', parse_sina)):
+        payload = '\n'.join(recordings.quotes.get(host, {}).values()).encode('gbk')
+        for quote in parse(payload, with_name=True):
+            ts_code = f"{quote.code[2:]}.{quote.code[:2].upper()}"
+            expected.setdefault(ts_code, {})[provider] = (quote.price, quote.precision, quote.name)
+    for secid, item in recordings.quotes.get('push2.eastmoney.com', {}).items():
+        ts_code = f"{secid[2:]}.{'SH' if secid[0] == '1' else 'SZ'}"
+        expected.setdefault(ts_code, {})['eastmoney'] = (item['f2'], item['f1'], None)
+    return expected
+
+
+def expected_klines(recordings, days):
+    """录制的东方财富不复权日K线，返回 {ts_code: (最后 days 根的日期, 收盘价)}"""
+    expected = {}
+    for key, entry in recordings.responses.items():
+        if not key.startswith('push2his.eastmoney.com') or 'fqt=0' not in key:
+            continue
+        secid = key.split('secid=')[1].split('&')[0]
+        ts_code = f"{secid[2:]}.{'SH' if secid[0] == '1' else 'SZ'}"
+        lines = [line.split(',') for line in json.loads(entry['body'])['data']['klines']][-days:]
+        expected[ts_code] = ([int(line[0].replace('-', '')) for line in lines],
+                             [float(line[2]) for line in lines])
+    return expected
+
+
+def scenario_ops(service, recordings, batch_size, cache):
+    """各场景的单次操作，返回结果是否与录制数据一致"""
+    quotes = expected_quotes(recordings)
+    codes = sorted(quotes)
+    klines = expected_klines(recordings, 30)
+    kline_codes = sorted(klines)
+
+    def quote_ok(code, quote, providers=('tencent', 'sina', 'eastmoney')):
+        # 行情源之间的价格精度可能不同，与实际返回的行情源的录制数据一致即可
+        return any(tuple(quote) == recorded[:2] for provider, recorded in quotes[code].items()
+                   if provider in providers)
+
+    def batched(i):
+        requested = [codes[(i + j) % len(codes)] for j in range(batch_size)]
+        result = service.get_realtime_quotes(requested)
+        return set(result) == set(requested) and all(quote_ok(code, quote) for code, quote in result.items())
+
+    def info(i):
+        code = codes[i % len(codes)]
+        result = (service.get_stock_info if cache else service._fetch_stock_info)(code)
+        return (bool(result) and result['name'] == quotes[code]['tencent'][2]
+                and quote_ok(code, (result['current_price'], result['price_precision'])))
+
+    def kline(i):
+        code = kline_codes[i % len(kline_codes)]
+        bars = service._fetch_kline(code, 30, 'none', None)
+        dates, closes = klines[code]
+        return bars is not None and list(bars['date']) == dates and list(bars['close']) == closes
+
+    return {
+        'single': lambda i: quote_ok(codes[i % len(codes)], service.get_realtime_price(codes[i % len(codes)])),
+        'batched': batched,
+        # 腾讯始终返回错误，结果只能来自备用行情源
+        'fallback': lambda i: quote_ok(codes[i % len(codes)], service.get_realtime_price(codes[i % len(codes)]),
+                                       providers=('sina', 'eastmoney')),
+        'info': info,
+        'search': lambda i: codes[i % len(codes)] in {stock['ts_code'] for stock in service.search_stocks(
+            codes[i % len(codes)].split('.')[0])},
+        'kline': kline,
+    }
+
+
+def print_table(results, baseline=None):
+    print(f"{'场景':<10}{'次数':>6}{'失败':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'吞吐(次/秒)':>14}")
+    for name, r in results.items():
+        line = (f"{name:<10}{r['count']:>6}{r['errors']:>6}{r['p50']:>10.2f}{r['p95']:>10.2f}"
+                f"{r['p99']:>10.2f}{r['throughput']:>14.1f}")
+        old = (baseline or {}).get(name)
+        if old:
+            deltas = [(r[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+                      for key in ('p50', 'p95', 'p99', 'throughput')]
+            line += '   对比: ' + ' '.join(f"{d:+.0f}%" for d in deltas)
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help='每个场景的调用次数')
+    parser.add_argument('--concurrency', type=int, default=1, help='并发线程数')
+    parser.add_argument('--batch-size', type=int, default=60, help='batched 场景每次请求的股票数量')
+    parser.add_argument('--latency-ms', type=float, default=20, help='回放服务器的固定延迟(毫秒)')
+    parser.add_argument('--jitter-ms', type=float, default=10, help='回放服务器的随机延迟上限(毫秒)')
+    parser.add_argument('--error-rate', type=float, default=0, help='回放服务器返回503的比例')
+    parser.add_argument('--timeout-rate', type=float, default=0, help='回放服务器不响应的比例')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='只运行指定场景，可重复')
+    parser.add_argument('--recordings', default=DEFAULT_RECORDINGS, help='录制文件')
+    parser.add_argument('--cache', action='store_true', help='开启实时行情缓存和股票信息缓存')
+    parser.add_argument('--seed', type=int, default=1, help='回放服务器随机数种子')
+    parser.add_argument('--json', help='把结果保存到文件')
+    parser.add_argument('--compare', help='与之前保存的结果文件对比')
+    args = parser.parse_args()
+
+    recordings = Recordings(args.recordings)
+    server = ReplayServer(('127.0.0.1', 0), recordings,
+                          latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                          error_rate=args.error_rate, timeout_rate=args.timeout_rate,
+                          timeout=30, seed=args.seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        service = build_service(server.url, workdir, args.cache)
+        ops = scenario_ops(service, recordings, args.batch_size, args.cache)
+        for name in args.scenario or SCENARIOS:
+            # 每个场景使用新的健康统计，互不影响
+            service.providers = ProviderRegistry(failure_threshold=service.providers.failure_threshold,
+                                                 cooldown=service.providers.cooldown)
+            server.fail_hosts = {'qt.gtimg.cn'} if name == 'fallback' else set()
+            results[name] = summarize(*run(ops[name], args.requests, args.concurrency))
+        service.close()
+    server.shutdown()
+
+    print(f"回放延迟 {args.latency_ms:g}+{args.jitter_ms:g} ms，错误率 {args.error_rate:g}，"
+          f"超时率 {args.timeout_rate:g}，并发 {args.concurrency}，缓存{'开' if args.cache else '关'}")
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print_table(results, baseline)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""SQLite 并发读写性能测试
+
+在临时数据库中写入 --trades 条交易记录，然后在 --duration 秒内同时运行：
+  读线程（--readers 个）：反复执行主表查询 lowest_active_trades，模拟界面刷新
+  写线程：不停地插入交易并更新目标价格，模拟后台任务写库
+分别对比回滚日志（DELETE）与 WAL 模式、逐条提交与 BatchWriter 批量提交，
+统计读延迟 p50/p95/p99、每秒读次数、每秒写入条数和失败次数（如 database is locked）。
+
+用法：python benchmarks/bench_sqlite_concurrency.py --readers 4 --duration 5
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = [('DELETE', 'row'), ('DELETE', 'batch'), ('WAL', 'row'), ('WAL', 'batch')]
+
+
+def percentile(sorted_values, ratio):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * ratio))]
+
+
+def new_trade(Trade, rng, now):
+    price = round(rng.uniform(2, 50), 2)
+    return Trade(stock_code=f"{rng.randint(600000, 600400)}.SH", stock_name='测试',
+                 buy_price=price, buy_time=now - timedelta(days=rng.randint(0, 500)),
+                 sell_target=round(price * 1.1, 2), buy_target=round(price * 1.05, 2),
+                 sell_condition=0.15, buy_step=0.05, price_precision=2, is_active=rng.random() < 0.8)
+
+
+def run_mode(workdir, journal_mode, write_mode, args):
+    from sqlalchemy.orm import sessionmaker
+    from models import Trade, create_db_engine, lowest_active_trades
+    from migrations import migrate
+    from db_writer import BatchWriter
+
+    path = os.path.join(workdir, f"{journal_mode.lower()}_{write_mode}.db")
+    db_engine = create_db_engine(f"sqlite:///{path}", journal_mode=journal_mode)
+    migrate(db_engine)
+    factory = sessionmaker(bind=db_engine)
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    session = factory()
+    session.add_all([new_trade(Trade, rng, now) for _ in range(args.trades)])
+    session.commit()
+    session.close()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    read_latencies = []
+    counts = {'writes': 0, 'read_errors': 0, 'write_errors': 0}
+
+    def reader():
+        session = factory()
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                lowest_active_trades(session)
+                session.rollback()
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    read_latencies.append(elapsed)
+            except Exception:
+                session.rollback()
+                with lock:
+                    counts['read_errors'] += 1
+        session.close()
+
+    def write_job(rng):
+        trade = new_trade(Trade, rng, now)
+        target_id = rng.randint(1, args.trades)
+
+        def apply(session):
+            session.add(trade)
+            session.query(Trade).filter(Trade.id == target_id).update(
+                {Trade.buy_target: Trade.buy_target * 1.0001})
+        return apply
+
+    def writer():
+        rng = random.Random(args.seed + 1)
+        if write_mode == 'batch':
+            batch_writer = BatchWriter(factory, flush_interval=args.flush_ms / 1000)
+            while not stop.is_set():
+                batch_writer.submit(write_job(rng))
+                with lock:
+                    counts['writes'] += 1
+                # 模拟后台任务产生写操作的间隔
+                time.sleep(args.write_gap_ms / 1000)
+            batch_writer.flush()
+            return
+        session = factory()
+        while not stop.is_set():
+            try:
+                write_job(rng)(session)
+                session.commit()
+                with lock:
+                    counts['writes'] += 1
+            except Exception:
+                session.rollback()
+                with lock:
+                    counts['write_errors'] += 1
+            time.sleep(args.write_gap_ms / 1000)
+        session.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads.append(threading.Thread(target=writer))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    db_engine.dispose()
+
+    read_latencies.sort()
+    return {
+        'reads_per_sec': len(read_latencies) / wall,
+        'p50': percentile(read_latencies, 0.50),
+        'p95': percentile(read_latencies, 0.95),
+        'p99': percentile(read_latencies, 0.99),
+        'writes_per_sec': counts['writes'] / wall,
+        'errors': counts['read_errors'] + counts['write_errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--trades', type=int, default=5000, help='初始交易记录数量')
+    parser.add_argument('--readers', type=int, default=4, help='读线程数量')
+    parser.add_argument('--duration', type=float, default=5, help='每种模式的运行秒数')
+    parser.add_argument('--write-gap-ms', type=float, default=1, help='两次写操作之间的间隔(毫秒)')
+    parser.add_argument('--flush-ms', type=float, default=50, help='BatchWriter 收集一批写操作的最长等待(毫秒)')
+    parser.add_argument('--seed', type=int, default=1, help='随机数种子')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{'日志模式':<10}{'写入':<8}{'读/秒':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+              f"{'写/秒':>10}{'失败':>6}")
+        for journal_mode, write_mode in MODES:
+            r = run_mode(workdir, journal_mode, write_mode, args)
+            print(f"{journal_mode:<10}{write_mode:<8}{r['reads_per_sec']:>10.1f}{r['p50']:>10.2f}"
+                  f"{r['p95']:>10.2f}{r['p99']:>10.2f}{r['writes_per_sec']:>10.1f}{r['errors']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""行情记录性能测试
+
+模拟 --symbols 支股票每轮全部变价，共 --rounds 轮，按轮调用 TickRecorder.record（与行情订阅
+回调相同），统计：
+  回调耗时：拉取行情的线程每次调用 record 的 p50/p99（微秒）
+  写入速度：从第一次回调到全部落盘的每秒记录数
+  读取耗时：read_day 映射当天文件以及取出单支股票分时数据的耗时
+
+用法：python benchmarks/bench_tick_recorder.py --symbols 500 --rounds 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stock_service import Tick
+from tick_recorder import TickRecorder
+
+
+def percentile(sorted_values, ratio):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * ratio))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=500, help='股票数量')
+    parser.add_argument('--rounds', type=int, default=200, help='行情轮数，每轮所有股票各一个事件')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        codes = [f"{600000 + i}.SH" for i in range(args.symbols)]
+        start_time = datetime.now().replace(hour=9, minute=30, second=0, microsecond=0)
+        rounds = []
+        for r in range(args.rounds):
+            now = start_time + timedelta(seconds=r * 3)
+            rounds.append([Tick(code, 10 + (i + r) % 100 / 100, 2, None, now, 1000.0 * r)
+                           for i, code in enumerate(codes)])
+
+        recorder = TickRecorder(os.path.join(workdir, 'tick_data'))
+        latencies = []
+        begin = time.perf_counter()
+        for ticks in rounds:
+            start = time.perf_counter()
+            recorder.record(ticks)
+            latencies.append((time.perf_counter() - start) * 1_000_000)
+        recorder.flush()
+        wall = time.perf_counter() - begin
+
+        start = time.perf_counter()
+        records = recorder.read_day(start_time.date())
+        read_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        times, prices, volumes = recorder.intraday(codes[0], start_time.date())
+        intraday_ms = (time.perf_counter() - start) * 1000
+        total = len(records)
+        # 释放对文件的映射后才能删除临时目录
+        del records, times, prices, volumes
+        recorder.close()
+
+    latencies.sort()
+    print(f"记录数 {total}（预期 {args.symbols * args.rounds}）")
+    print(f"回调耗时 p50 {percentile(latencies, 0.5):.1f} us，p99 {percentile(latencies, 0.99):.1f} us"
+          f"（每次 {args.symbols} 个事件）")
+    print(f"写入速度 {total / wall:,.0f} 条/秒")
+    print(f"read_day {read_ms:.2f} ms，intraday {intraday_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""行情接口的本地录制/回放服务器
+
+StockService 设置 QUOTE_REPLAY_URL 后，所有行情请求改发到本服务器，原主机名放在
+路径第一段（见 http_pool.ProviderHttpPool.rewrite）。服务器按录制文件回放腾讯、
+新浪、东方财富的响应，可配置延迟、错误率、超时率和始终失败的主机，用于在不访问
+真实行情接口的情况下测量和回归测试行情路径的性能。
+
+录制文件中批量行情按股票分别保存，任意组合的批量请求都可以拼出响应；其余接口
+去掉时间戳、回调名等易变参数后按地址匹配。
+
+用法：
+  python benchmarks/replay_server.py --port 8901 --latency-ms 30 --error-rate 0.05
+      回放 benchmarks/fixtures/replay.json，之后以 QUOTE_REPLAY_URL=http://127.0.0.1:8901 启动程序
+  python benchmarks/replay_server.py --port 8901 --record --recordings my.json
+      录制模式：转发到真实行情接口并把响应追加到录制文件
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+
+DEFAULT_RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'replay.json')
+
+# 每次请求都会变化的参数，匹配时忽略
+VOLATILE_PARAMS = {'_', 'cb', 'ut', 'token'}
+# 按行返回批量行情的接口: 主机 -> (路径前缀, 行前缀, 未知代码时返回的行)
+QUOTE_LINE_HOSTS = {
+    'qt.gtimg.cn': ('/q=', 'v_', 'v_pv_none_match="1";'),
+    'hq.sinajs.cn': ('/list=', 'var hq_str_', 'var hq_str_{code}="";'),
+}
+EASTMONEY_QUOTES = ('push2.eastmoney.com', '/api/qt/ulist.np/get')
+GBK_HOSTS = {'qt.gtimg.cn', 'hq.sinajs.cn'}
+HTTP_HOSTS = {'hq.sinajs.cn'}
+PROVIDER_HEADERS = {'hq.sinajs.cn': {'Referer': 'https://finance.sina.com.cn'}}
+# 只按这些参数匹配的接口，其余参数（字段列表、日期范围、数量等）忽略
+KEY_PARAMS = {
+    ('push2.eastmoney.com', '/api/qt/stock/get'): ('secid',),
+    ('push2his.eastmoney.com', '/api/qt/stock/kline/get'): ('secid', 'fqt'),
+    ('searchapi.eastmoney.com', '/api/suggest/get'): ('input',),
+    ('money.finance.sina.com.cn', '/quotes_service/api/json_v2.php/CN_MarketData.getKLineData'): ('symbol',),
+}
+
+
+def request_key(host, path, params):
+    """录制响应的匹配键"""
+    if (host, path) in KEY_PARAMS:
+        params = {k: params[k] for k in KEY_PARAMS[host, path] if k in params}
+    elif host == 'web.ifzq.gtimg.cn':
+        # param=代码,day,开始日期,结束日期,数量,复权 只保留代码和复权方式
+        fields = params.get('param', '').split(',')
+        params = {'param': f"{fields[0]},{fields[-1]}"}
+    else:
+        params = {k: v for k, v in params.items() if k not in VOLATILE_PARAMS}
+    return f"{host}{path}?{urlencode(sorted(params.items()))}"
+
+
+class Recordings:
+    """录制的响应"""
+
+    def __init__(self, path):
+        self.path = path
+        self.responses = {}  # 匹配键 -> {status, content_type, body}
+        self.quotes = {}     # 主机 -> {代码: 行情行或行情字段}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.responses = data.get('responses', {})
+            self.quotes = data.get('quotes', {})
+
+    def lookup(self, host, path, params):
+        """返回 (状态码, Content-Type, 文本)，没有录制时返回None"""
+        if host in QUOTE_LINE_HOSTS:
+            prefix, line_prefix, missing = QUOTE_LINE_HOSTS[host]
+            if path.startswith(prefix):
+                lines = self.quotes.get(host, {})
+                body = ''.join(lines.get(code, missing.format(code=code)) + '\n'
+                               for code in path[len(prefix):].split(','))
+                return 200, 'text/plain; charset=GBK', body
+        if (host, path) == EASTMONEY_QUOTES:
+            items = self.quotes.get(host, {})
+            diff = [items[secid] for secid in params.get('secids', '').split(',') if secid in items]
+            body = json.dumps({'rc': 0, 'data': {'total': len(diff), 'diff': diff} if diff else None},
+                              ensure_ascii=False)
+            return 200, 'application/json; charset=UTF-8', body
+        entry = self.responses.get(request_key(host, path, params))
+        if entry is None:
+            return None
+        return entry['status'], entry['content_type'], entry['body']
+
+    def add(self, host, path, params, status, content_type, body):
+        """保存一个真实响应，批量行情拆分为单只股票"""
+        with self._lock:
+            if host in QUOTE_LINE_HOSTS and path.startswith(QUOTE_LINE_HOSTS[host][0]):
+                line_prefix = QUOTE_LINE_HOSTS[host][1]
+                for line in body.splitlines():
+                    line = line.strip()
+                    if line.startswith(line_prefix) and '="' in line:
+                        code = line[len(line_prefix):line.index('="')]
+                        self.quotes.setdefault(host, {})[code] = line
+            elif (host, path) == EASTMONEY_QUOTES:
+                data = json.loads(body).get('data') or {}
+                for item in data.get('diff') or []:
+                    self.quotes.setdefault(host, {})[f"{item.get('f13')}.{item.get('f12')}"] = item
+            else:
+                self.responses[request_key(host, path, params)] = {
+                    'status': status, 'content_type': content_type, 'body': body
+                }
+            self.save()
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'responses': self.responses, 'quotes': self.quotes}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        host, _, rest = self.path.lstrip('/').partition('/')
+        url = urlsplit('/' + rest)
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        server.count(host)
+
+        if server.record:
+            self.proxy(host, '/' + rest, url.path, params)
+            return
+        fault = server.fault(host)
+        if fault == 'timeout':
+            # 不返回响应，直到客户端读取超时
+            time.sleep(server.timeout)
+            self.close_connection = True
+            return
+        time.sleep(server.delay())
+        if fault == 'error':
+            self.reply(503, 'text/plain', 'replay: injected error', 'utf-8')
+            return
+        result = server.recordings.lookup(host, url.path, params)
+        if result is None:
+            self.reply(404, 'text/plain', f"replay: no recording for {host}{url.path}", 'utf-8')
+            return
+        status, content_type, body = result
+        self.reply(status, content_type, body, 'gbk' if host in GBK_HOSTS else 'utf-8')
+
+    def proxy(self, host, path_and_query, path, params):
+        scheme = 'http' if host in HTTP_HOSTS else 'https'
+        try:
+            response = requests.get(f"{scheme}://{host}{path_and_query}",
+                                    headers=PROVIDER_HEADERS.get(host, {}), timeout=10)
+        except requests.RequestException as e:
+            self.reply(502, 'text/plain', f"replay: {e}", 'utf-8')
+            return
+        encoding = 'gbk' if host in GBK_HOSTS else (response.encoding or 'utf-8')
+        body = response.content.decode(encoding, errors='replace')
+        content_type = response.headers.get('Content-Type', 'text/plain')
+        if response.status_code == 200:
+            self.server.recordings.add(host, path, params, response.status_code, content_type, body)
+        self.reply(response.status_code, content_type, body, encoding)
+
+    def reply(self, status, content_type, body, encoding):
+        payload = body.encode(encoding, errors='replace')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """回放服务器，延迟和故障参数可在运行中修改"""
+
+    daemon_threads = True
+
+    def __init__(self, address, recordings, latency=0.0, jitter=0.0, error_rate=0.0,
+                 timeout_rate=0.0, timeout=10.0, fail_hosts=(), record=False, seed=None):
+        super().__init__(address, ReplayHandler)
+        self.recordings = recordings
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout = timeout
+        self.fail_hosts = set(fail_hosts)
+        self.record = record
+        self.requests = {}  # 主机 -> 请求次数
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, host):
+        with self._lock:
+            self.requests[host] = self.requests.get(host, 0) + 1
+
+    def delay(self):
+        with self._lock:
+            return self.latency + self._rng.uniform(0, self.jitter)
+
+    def fault(self, host):
+        """本次请求注入的故障: None, 'error' 或 'timeout'"""
+        if host in self.fail_hosts:
+            return 'error'
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.timeout_rate:
+            return 'timeout'
+        if roll < self.timeout_rate + self.error_rate:
+            return 'error'
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8901, help='监听端口')
+    parser.add_argument('--recordings', default=DEFAULT_RECORDINGS, help='录制文件')
+    parser.add_argument('--record', action='store_true', help='录制模式，转发到真实行情接口')
+    parser.add_argument('--latency-ms', type=float, default=0, help='每个响应的固定延迟(毫秒)')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='在固定延迟上增加的随机延迟上限(毫秒)')
+    parser.add_argument('--error-rate', type=float, default=0, help='返回503的比例')
+    parser.add_argument('--timeout-rate', type=float, default=0, help='不返回响应直到客户端超时的比例')
+    parser.add_argument('--fail-host', action='append', default=[], help='始终返回503的主机，可重复')
+    args = parser.parse_args()
+
+    server = ReplayServer(('127.0.0.1', args.port), Recordings(args.recordings),
+                          latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                          error_rate=args.error_rate, timeout_rate=args.timeout_rate,
+                          fail_hosts=args.fail_host, record=args.record)
+    mode = '录制' if args.record else '回放'
+    print(f"{mode}服务器: {server.url}，录制文件: {args.recordings}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""东方财富推送行情的本地模拟服务器
+
+模拟 /api/qt/ulist/sse 接口：连接建立后先推送完整快照（full=1），之后每隔
+--interval 秒随机挑选几只股票推送价格变化（只含变化字段）。--drop-after 指定
+每个连接推送多少条消息后主动断开，用来检验客户端的重连。
+
+用法：
+  python benchmarks/sse_stub_server.py --serve --port 8900
+      只启动模拟服务器，可将 EASTMONEY_STREAM_URL 设置为 http://127.0.0.1:8900
+  python benchmarks/sse_stub_server.py --symbols 120 --seconds 10
+      启动模拟服务器并用 EastmoneyStream 连接，统计收到的价格事件、连接数，
+      以及相同时间内按 --poll-interval 轮询所需的请求数
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from http_pool import ProviderHttpPool
+from eastmoney_stream import EastmoneyStream
+
+
+class SseHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/api/qt/ulist/sse':
+            self.send_error(404)
+            return
+        secids = parse_qs(url.query).get('secids', [''])[0].split(',')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        rng = random.Random()
+        prices = [round(rng.uniform(3, 100), 2) for _ in secids]
+        full = {str(i): {'f1': 2, 'f2': prices[i], 'f12': secid.split('.')[1], 'f13': int(secid.split('.')[0])}
+                for i, secid in enumerate(secids)}
+        sent = 0
+        try:
+            self.send_event({'rc': 0, 'full': 1, 'data': {'total': len(secids), 'diff': full}})
+            sent += 1
+            while sent < self.server.drop_after:
+                time.sleep(self.server.interval)
+                diff = {}
+                for i in rng.sample(range(len(secids)), min(3, len(secids))):
+                    prices[i] = round(max(0.01, prices[i] + rng.choice((-0.01, 0.01))), 2)
+                    diff[str(i)] = {'f2': prices[i]}
+                self.send_event({'rc': 0, 'full': 0, 'data': {'diff': diff}})
+                sent += 1
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def send_event(self, message):
+        self.wfile.write(f"data: {json.dumps(message)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+        self.server.events += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SseServer(ThreadingHTTPServer):
+    daemon_threads = True
+    interval = 0.2
+    drop_after = 10 ** 9
+    events = 0
+
+
+class CountingStream:
+    """替代 QuoteStream，只统计发布的价格事件"""
+
+    def __init__(self):
+        self.ticks = 0
+
+    def publish(self, quotes, volumes=None):
+        self.ticks += len(quotes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--serve', action='store_true', help='只启动模拟服务器')
+    parser.add_argument('--port', type=int, default=0, help='监听端口，默认随机')
+    parser.add_argument('--interval', type=float, default=0.2, help='推送间隔(秒)')
+    parser.add_argument('--drop-after', type=int, default=20, help='每个连接推送多少条后断开')
+    parser.add_argument('--symbols', type=int, default=120, help='订阅的股票数量')
+    parser.add_argument('--batch-size', type=int, default=50, help='每个连接的股票数量')
+    parser.add_argument('--seconds', type=float, default=10, help='测试时长(秒)')
+    parser.add_argument('--poll-interval', type=float, default=60, help='对比的轮询间隔(秒)')
+    args = parser.parse_args()
+
+    server = SseServer(('127.0.0.1', args.port), SseHandler)
+    server.interval = args.interval
+    server.drop_after = args.drop_after
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    if args.serve:
+        print(f"模拟推送服务器: {base_url}")
+        server.serve_forever()
+        return
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    codes = [f"{600000 + i}.SH" for i in range(args.symbols)]
+    http = ProviderHttpPool()
+    counter = CountingStream()
+    stream = EastmoneyStream(counter, http, base_url=base_url, batch_size=args.batch_size,
+                             min_backoff=0.1, max_backoff=1)
+    stream.set_symbols(codes)
+    time.sleep(args.seconds)
+    stream.stop()
+    http.close()
+    server.shutdown()
+
+    batches = (args.symbols + args.batch_size - 1) // args.batch_size
+    polls = int(args.seconds / args.poll_interval + 1) * batches
+    print(f"股票数: {args.symbols}，连接批次: {batches}，时长: {args.seconds} 秒")
+    print(f"推送: 建立连接 {stream.connections} 次，服务器消息 {server.events} 条，价格事件 {counter.ticks} 个")
+    print(f"轮询({args.poll_interval:g} 秒): 批量请求 {polls} 次，价格最多更新 {polls // batches} 次")
+
+
+if __name__ == '__main__':
+    main()
@@ -105,11 +105,12 @@ class CloudSync:
             QMessageBox.warning(parent_widget, "OneDrive功能已禁用", "请使用WebDAV进行云存储同步")
         return False
             
-    def backup_data(self, data, parent_widget=None):
-        """备份数据到云存储"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'backup_{timestamp}.json'
-        json_data = json.dumps(data)
+    def backup_data(self, data, parent_widget=None, filename=None):
+        """备份数据到云存储，data 为字符串时原样上传"""
+        if filename is None:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            filename = f'backup_{timestamp}.json'
+        json_data = data if isinstance(data, str) else json.dumps(data)
         
         success = False
         error_msg = ""
@@ -203,8 +204,8 @@ class CloudSync:
             
         return success
             
-    def restore_data(self, backup_file, from_source='onedrive', parent_widget=None):
-        """从云存储恢复数据"""
+    def restore_data(self, backup_file, from_source='onedrive', parent_widget=None, raw=False):
+        """从云存储恢复数据，raw 为真时返回文件文本"""
         try:
             if from_source == 'onedrive' and self.onedrive_enabled:
                 if self.authenticate_onedrive(parent_widget):
@@ -216,7 +217,7 @@ class CloudSync:
                         file = folder.get_item(backup_file)
                         if file:
                             content = file.get_content()
-                            return json.loads(content)
+                            return content if raw else json.loads(content)
             elif from_source == 'webdav' and self.webdav_enabled:
                 remote_path = f"TradeBackup/{backup_file}"
                 
@@ -227,7 +228,7 @@ class CloudSync:
                     
                     # 读取文件内容
                     with open(temp_file, 'r') as f:
-                        data = json.loads(f.read())
+                        data = f.read() if raw else json.loads(f.read())
                     
                     # 删除临时文件
                     os.remove(temp_file)
@@ -240,8 +241,8 @@ class CloudSync:
             print(f"恢复失败: {e}")
             return None
             
-    def get_backup_files(self, from_source='onedrive', parent_widget=None):
-        """获取所有备份文件列表"""
+    def get_backup_files(self, from_source='onedrive', parent_widget=None, suffix='.json'):
+        """获取所有备份文件列表，suffix 为 .jsonl 时返回交易账本文件"""
         try:
             if from_source == 'onedrive' and self.onedrive_enabled:
                 if self.authenticate_onedrive(parent_widget):
@@ -251,11 +252,11 @@ class CloudSync:
                     
                     if folder:
                         files = folder.get_items()
-                        return [item.name for item in files if item.name.endswith('.json')]
+                        return [item.name for item in files if item.name.endswith(suffix)]
             elif from_source == 'webdav' and self.webdav_enabled:
                 if self.webdav_client.check('TradeBackup'):
                     files = self.webdav_client.list('TradeBackup')
-                    return [f for f in files if f.endswith('.json')]
+                    return [f for f in files if f.endswith(suffix)]
                     
             return []
         except Exception as e:
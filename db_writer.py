@@ -0,0 +1,107 @@
+import queue
+import threading
+
+from models import ScopedSession
+
+_STOP = object()  # 队列中的停止标记
+
+
+class BatchWriter:
+    """后台线程批量写数据库
+
+    后台任务通过 submit 提交写操作 fn(session)，写线程把排队的操作合并到一个事务中提交，
+    避免每次写入单独提交。合并的事务失败时回滚，再逐个重试，单个失败的操作不影响其他操作。
+    stop 之后不再接受新的写操作。目前用于股票信息缓存等后台写入；交易的增删改是用户操作，
+    仍在界面线程的会话中同步提交。
+    """
+
+    def __init__(self, session_factory=ScopedSession, max_batch=200, flush_interval=0.5):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def submit(self, fn):
+        """提交写操作，fn 在写线程中以 session 为参数执行，不需要自己提交；停止后抛出 RuntimeError"""
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("写线程已停止")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+            self._queue.put(fn)
+
+    def flush(self, timeout=None):
+        """等待已提交的写操作全部完成"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                return True
+            if self._stopped:
+                thread = self._thread
+            else:
+                done = threading.Event()
+                self._queue.put(done)
+                thread = None
+        if thread is not None:
+            # 已经在停止，等写线程写完剩余操作后结束
+            thread.join(timeout)
+            return not thread.is_alive()
+        return done.wait(timeout)
+
+    def stop(self, timeout=5):
+        """写完已提交的操作后停止写线程，返回写线程是否已结束"""
+        with self._lock:
+            if self._stopped:
+                return self._thread is None or not self._thread.is_alive()
+            self._stopped = True
+            if self._thread is None:
+                return True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _run(self):
+        session = self.session_factory()
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            # 等待一小段时间收集更多操作，遇到 flush 或停止标记时立即写入
+            try:
+                while (len(batch) < self.max_batch and batch[-1] is not _STOP
+                       and not isinstance(batch[-1], threading.Event)):
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            stopping = batch[-1] is _STOP
+            jobs = [item for item in batch if item is not _STOP and not isinstance(item, threading.Event)]
+            if jobs:
+                self._write(session, jobs)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+        session.close()
+        # 停止前排队的 flush 不再等待
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def _write(self, session, jobs):
+        try:
+            for fn in jobs:
+                fn(session)
+            session.commit()
+            return
+        except Exception as e:
+            session.rollback()
+            if len(jobs) == 1:
+                print(f"写入数据库失败: {e}")
+                return
+        for fn in jobs:
+            self._write(session, [fn])
@@ -0,0 +1,163 @@
+import json
+import threading
+
+import requests
+
+# 推送的字段: f1 价格小数位数, f2 最新价, f5 成交量(手), f12 代码, f13 市场编号
+STREAM_FIELDS = 'f1,f2,f5,f12,f13'
+STREAM_UT = 'fa5fd1943c7b386f172d6893dbfba10b'
+
+
+def to_secid(ts_code):
+    """转换为东方财富的证券编号，如 600000.SH -> 1.600000"""
+    symbol, _, market = ts_code.partition('.')
+    return f"{1 if market == 'SH' else 0}.{symbol}"
+
+
+def parse_event(line):
+    """解析一行SSE数据，不是数据行或无法解析时返回None"""
+    if not line.startswith('data:'):
+        return None
+    try:
+        return json.loads(line[5:].strip())
+    except ValueError:
+        return None
+
+
+class QuoteBoard:
+    """一个连接对应的行情板
+
+    首条消息（full=1）给出每个位置上的完整字段，之后的消息只包含变化的字段，
+    按位置合并到已有记录上。
+    """
+
+    def __init__(self, stock_codes):
+        # 东方财富按 (市场编号, 代码) 返回，换回订阅时使用的股票代码
+        self.codes = {tuple(to_secid(code).split('.')): code for code in stock_codes}
+        self.rows = {}  # 位置 -> 字段
+        self.volumes = {}  # 股票代码 -> 累计成交量（股）
+
+    def apply(self, message):
+        """合并一条消息，返回价格有更新的 {股票代码: (价格, 价格精度)}"""
+        data = message.get('data') or {}
+        diff = data.get('diff')
+        if diff is None:
+            return {}
+        if message.get('full') == 1:
+            self.rows = {}
+        if isinstance(diff, list):
+            diff = {str(position): fields for position, fields in enumerate(diff)}
+        quotes = {}
+        for position, fields in diff.items():
+            row = self.rows.setdefault(position, {})
+            row.update(fields)
+            code = self.codes.get((str(row.get('f13')), str(row.get('f12'))))
+            if code and isinstance(fields.get('f5'), (int, float)):
+                self.volumes[code] = fields['f5'] * 100
+            if 'f2' not in fields:
+                continue
+            price = row.get('f2')
+            # 停牌或尚未成交时价格为 "-"
+            if code and isinstance(price, (int, float)) and price > 0:
+                quotes[code] = (price, row.get('f1', 2))
+        return quotes
+
+
+class EastmoneyStream:
+    """东方财富推送行情客户端
+
+    每批股票保持一个长连接，接收服务器推送的增量字段，合并到行情板后
+    发布到 QuoteStream。连接断开后按指数退避重连，收到数据后退避时间复位。
+    """
+
+    def __init__(self, quote_stream, http, base_url='https://push2.eastmoney.com',
+                 batch_size=50, read_timeout=60, min_backoff=1, max_backoff=60):
+        self.quote_stream = quote_stream
+        self.http = http
+        self.base_url = base_url.rstrip('/')
+        self.batch_size = batch_size
+        self.read_timeout = read_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stock_codes = []
+        self.connections = 0  # 累计建立的连接数
+        self._live = set()    # 连接正常的批次
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def batch_url(self, batch):
+        secids = ','.join(to_secid(code) for code in batch)
+        return (f"{self.base_url}/api/qt/ulist/sse?invt=2&fltt=2&fields={STREAM_FIELDS}"
+                f"&secids={secids}&ut={STREAM_UT}")
+
+    def set_symbols(self, stock_codes):
+        """替换推送的股票，股票有变化时重建所有连接"""
+        stock_codes = sorted(stock_codes)
+        if stock_codes == self.stock_codes and self._threads:
+            return
+        self.stop()
+        self.stock_codes = stock_codes
+        if not stock_codes:
+            return
+        self._stop = threading.Event()
+        for start in range(0, len(stock_codes), self.batch_size):
+            batch = tuple(stock_codes[start:start + self.batch_size])
+            thread = threading.Thread(target=self._run, args=(batch, self._stop),
+                                      name='eastmoney-stream', daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def live_symbols(self):
+        """连接正常、正在接收推送的股票"""
+        with self._lock:
+            return {code for batch in self._live for code in batch}
+
+    def stop(self):
+        """断开所有连接，不等待线程结束，线程在下一条消息或超时后退出"""
+        self._stop.set()
+        self._threads = []
+        with self._lock:
+            self._live.clear()
+
+    def _run(self, batch, stop):
+        backoff = self.min_backoff
+        while not stop.is_set():
+            try:
+                if self._consume(batch, stop):
+                    backoff = self.min_backoff
+            except (requests.RequestException, OSError) as e:
+                print(f"东方财富推送连接失败: {e}")
+            finally:
+                with self._lock:
+                    if not stop.is_set():
+                        self._live.discard(batch)
+            if stop.wait(backoff):
+                break
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _consume(self, batch, stop):
+        """读取一个连接直到断开，返回是否收到过数据"""
+        board = QuoteBoard(batch)
+        received = False
+        response = self.http.get('eastmoney', self.batch_url(batch), stream=True,
+                                 timeout=(self.http.timeout[0], self.read_timeout))
+        self.connections += 1
+        with response:
+            response.raise_for_status()
+            response.encoding = 'utf-8'
+            for line in response.iter_lines(decode_unicode=True):
+                if stop.is_set():
+                    break
+                message = parse_event(line or '')
+                if message is None:
+                    continue
+                if not received:
+                    received = True
+                    with self._lock:
+                        if not stop.is_set():
+                            self._live.add(batch)
+                quotes = board.apply(message)
+                if quotes:
+                    self.quote_stream.publish(quotes, board.volumes)
+        return received
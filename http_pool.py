@@ -0,0 +1,79 @@
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 各行情源的固定请求头
+PROVIDER_HEADERS = {
+    'sina': {"Referer": "https://finance.sina.com.cn"},
+}
+
+
+class ProviderHttpPool:
+    """按行情源划分的HTTP连接池
+
+    每个行情源（腾讯、新浪、东方财富）使用独立的 requests.Session，
+    连接保持长连接并在同一主机的后续请求中复用，避免每次请求都重新进行TCP和TLS握手。
+    指定 limiter 时每次请求前按主机取得令牌，超过速率时排队等待。
+    指定 replay_url 时所有请求改发到本地回放服务器，原主机名放在路径的第一段，
+    如 https://qt.gtimg.cn/q=sh600000 -> {replay_url}/qt.gtimg.cn/q=sh600000。
+    """
+
+    def __init__(self, pool_size=10, timeout=(3, 5), retries=0, backoff_factor=0.3, replay_url=None,
+                 limiter=None):
+        self.pool_size = pool_size
+        # (连接超时, 读取超时)，所有请求统一使用
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.replay_url = replay_url.rstrip('/') if replay_url else None
+        self.limiter = limiter
+        self.sessions = {}
+        self.closed = False
+
+    def session(self, provider):
+        """获取行情源对应的会话，首次使用时创建"""
+        session = self.sessions.get(provider)
+        if session is None:
+            session = requests.Session()
+            retry = Retry(
+                total=self.retries,
+                connect=self.retries,
+                read=self.retries,
+                backoff_factor=self.backoff_factor,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['GET']),
+                raise_on_status=False
+            )
+            # pool_maxsize 限制每个主机保留的长连接数量
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=retry)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update(PROVIDER_HEADERS.get(provider, {}))
+            session = self.sessions.setdefault(provider, session)
+        return session
+
+    def get(self, provider, url, **kwargs):
+        """通过行情源的连接池发送GET请求，未指定超时时使用统一超时"""
+        kwargs.setdefault('timeout', self.timeout)
+        if self.closed:
+            raise requests.ConnectionError("连接池已关闭")
+        if self.limiter:
+            self.limiter.acquire(urlsplit(url).netloc)
+        if self.replay_url:
+            url = self.rewrite(url)
+        return self.session(provider).get(url, **kwargs)
+
+    def rewrite(self, url):
+        """把行情源地址改写为回放服务器地址"""
+        parts = urlsplit(url)
+        query = f"?{parts.query}" if parts.query else ''
+        return f"{self.replay_url}/{parts.netloc}{parts.path}{query}"
+
+    def close(self):
+        """关闭所有连接，之后的请求直接失败"""
+        self.closed = True
+        for session in self.sessions.values():
+            session.close()
+        self.sessions.clear()
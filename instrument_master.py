@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # 未安装pypinyin时不支持拼音首字母搜索
+    lazy_pinyin = None
+
+
+def pinyin_initials(name):
+    """股票名称的拼音首字母，如 浦发银行 -> PFYH"""
+    if lazy_pinyin is None:
+        return ''
+    return ''.join(lazy_pinyin(name, style=Style.FIRST_LETTER, errors='default')).upper().replace(' ', '')
+
+
+class InstrumentMaster:
+    """本地证券代码表
+
+    保存沪深北A股和ETF的代码、名称、拼音首字母、市场和行业，定期整体刷新，
+    在内存中按代码、名称、拼音首字母建立有序前缀索引，搜索不需要访问网络。
+    """
+
+    def __init__(self, path='instruments.json', max_age=timedelta(days=1)):
+        self.path = path
+        self.max_age = max_age
+        self.updated_at = None
+        self.instruments = {}   # ts_code -> 记录
+        self.by_symbol = {}     # 6位代码 -> [ts_code]
+        self._index = [[], [], []]  # 按类别（代码、名称、拼音）分开的有序 (关键字, ts_code)
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """从本地文件加载代码表"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._build(data['instruments'])
+            self.updated_at = datetime.fromisoformat(data['updated_at'])
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(self.path):
+                print(f"加载证券代码表失败: {e}")
+
+    def update(self, records):
+        """用整体下载的记录替换代码表并保存到本地"""
+        for record in records:
+            if not record.get('pinyin'):
+                record['pinyin'] = pinyin_initials(record['name'])
+        self._build(records)
+        self.updated_at = datetime.now()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'updated_at': self.updated_at.isoformat(timespec='seconds'),
+                'instruments': records
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _build(self, records):
+        """建立索引，构建完成后整体替换，搜索线程不会看到构建到一半的索引"""
+        instruments = {}
+        by_symbol = {}
+        index = [[], [], []]
+        for record in records:
+            ts_code = record['ts_code']
+            instruments[ts_code] = record
+            by_symbol.setdefault(record['symbol'], []).append(ts_code)
+            # 类别决定搜索结果的排序: 代码匹配优先，其次名称，最后拼音
+            index[0].append((record['symbol'], ts_code))
+            index[1].append((record['name'], ts_code))
+            if record.get('pinyin'):
+                index[2].append((record['pinyin'], ts_code))
+        for category in index:
+            category.sort()
+        with self._lock:
+            self.instruments = instruments
+            self.by_symbol = by_symbol
+            self._index = index
+
+    def is_stale(self, now=None):
+        if self.updated_at is None:
+            return True
+        return (now or datetime.now()) - self.updated_at >= self.max_age
+
+    def resolve(self, symbol):
+        """根据6位代码确定完整代码，代码表中不存在或不唯一时返回None"""
+        ts_codes = self.by_symbol.get(symbol)
+        if ts_codes and len(ts_codes) == 1:
+            return ts_codes[0]
+        return None
+
+    def get(self, ts_code):
+        return self.instruments.get(ts_code)
+
+    def search(self, keyword, limit=20):
+        """按代码、名称或拼音首字母前缀搜索
+
+        依次在代码、名称、拼音索引中按关键字顺序取匹配项，找到 limit 条后停止扫描。
+        """
+        keyword = keyword.strip().upper()
+        if not keyword:
+            return []
+        with self._lock:
+            index = self._index
+            instruments = self.instruments
+        results = []
+        seen = set()
+        for category in index:
+            position = bisect_left(category, (keyword,))
+            while position < len(category) and category[position][0].startswith(keyword):
+                ts_code = category[position][1]
+                position += 1
+                if ts_code in seen:
+                    continue
+                seen.add(ts_code)
+                record = instruments[ts_code]
+                results.append({
+                    'ts_code': ts_code,
+                    'symbol': record['symbol'],
+                    'name': record['name'],
+                    'area': '',
+                    'industry': record.get('industry', ''),
+                    'list_date': ''
+                })
+                if len(results) >= limit:
+                    return results
+        return results
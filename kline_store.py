@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from market_calendar import last_price_change
+
+# 每根日K线44字节: 日期(YYYYMMDD整数) + 开收高低 + 成交量
+KLINE_DTYPE = np.dtype([
+    ('date', '<i4'),
+    ('open', '<f8'),
+    ('close', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('vol', '<f8'),
+])
+
+# 复权类型: none 不复权, qfq 前复权, hfq 后复权
+ADJUST_TYPES = ('none', 'qfq', 'hfq')
+
+
+class KlineStore:
+    """本地日K线存储
+
+    每只股票每种复权类型保存为一个按日期排序的 .npy 文件，读取时内存映射，
+    按日期二分查找切片，多年历史也只需读取用到的部分。Windows 下被映射的文件不能替换，
+    read 等方法在锁内映射并复制出结果，调用方不应在 write 时持有 load 返回的映射。
+    meta.json 记录每个序列最后一次从网络更新的时间，用于判断是否需要增量更新。
+    """
+
+    def __init__(self, root='kline_data'):
+        self.root = root
+        self._meta_path = os.path.join(root, 'meta.json')
+        self._lock = threading.Lock()
+        self._meta = self._load_meta()
+
+    def _load_meta(self):
+        try:
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self._meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self._meta_path)
+
+    def path(self, stock_code, adjust='none'):
+        return os.path.join(self.root, adjust, f"{stock_code}.npy")
+
+    def load(self, stock_code, adjust='none', mmap=True):
+        """读取全部K线，默认内存映射，mmap 为 False 时读入内存；不存在时返回空数组"""
+        try:
+            return np.load(self.path(stock_code, adjust), mmap_mode='r' if mmap else None)
+        except (OSError, ValueError):
+            return np.empty(0, dtype=KLINE_DTYPE)
+
+    def read(self, stock_code, adjust='none', start=None, end=None, count=None):
+        """读取日期范围 [start, end] 内的K线，count 指定时只取最后 count 根
+
+        start/end 可以是 date、datetime 或 YYYYMMDD 整数。返回的数组已复制到内存。
+        """
+        with self._lock:
+            bars = self.load(stock_code, adjust)
+            lo = np.searchsorted(bars['date'], _to_int_date(start), side='left') if start else 0
+            hi = np.searchsorted(bars['date'], _to_int_date(end), side='right') if end else len(bars)
+            if count is not None:
+                lo = max(lo, hi - count)
+            result = np.array(bars[lo:hi])
+            del bars
+        return result
+
+    def last_date(self, stock_code, adjust='none'):
+        with self._lock:
+            bars = self.load(stock_code, adjust)
+            result = int(bars['date'][-1]) if len(bars) else None
+            del bars
+        return result
+
+    def summary(self, stock_code, adjust='none'):
+        """(K线数量, 最后一根的收盘价)，不保留文件映射"""
+        with self._lock:
+            bars = self.load(stock_code, adjust)
+            result = len(bars), (float(bars['close'][-1]) if len(bars) else None)
+            del bars
+        return result
+
+    def write(self, stock_code, adjust, bars, merge=True, complete=False):
+        """保存K线，merge 为 True 时与已有数据合并，日期相同的以新数据为准
+
+        complete 表示已获取到该股票的全部历史，之后不再需要向前补数据。
+        """
+        key = f"{adjust}/{stock_code}"
+        with self._lock:
+            if merge:
+                # 读入内存而不映射，替换文件时不能有映射打开
+                existing = self.load(stock_code, adjust, mmap=False)
+                kept = existing[~np.isin(existing['date'], bars['date'])]
+                bars = np.concatenate([kept, bars])
+            bars = np.sort(bars, order='date')
+            path = self.path(stock_code, adjust)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp.npy'
+            np.save(tmp_path, bars)
+            os.replace(tmp_path, path)
+            meta = self._meta.setdefault(key, {})
+            meta['fetched_at'] = datetime.now().isoformat(timespec='seconds')
+            meta['complete'] = complete or meta.get('complete', False)
+            self._save_meta()
+
+    def is_complete(self, stock_code, adjust='none'):
+        return self._meta.get(f"{adjust}/{stock_code}", {}).get('complete', False)
+
+    def is_fresh(self, stock_code, adjust='none', now=None):
+        """上次更新后价格没有再变动过，可以直接使用本地数据"""
+        fetched_at = self._meta.get(f"{adjust}/{stock_code}", {}).get('fetched_at')
+        if not fetched_at:
+            return False
+        now = now or datetime.now()
+        return datetime.fromisoformat(fetched_at) >= last_price_change(now) and last_price_change(now) < now
+
+    @staticmethod
+    def from_frame(df):
+        """将接口返回的 DataFrame 转换为K线数组"""
+        bars = np.empty(len(df), dtype=KLINE_DTYPE)
+        bars['date'] = df['trade_date'].astype(str).str.replace('-', '').str[:8].astype(int).to_numpy()
+        for column in ('open', 'close', 'high', 'low', 'vol'):
+            bars[column] = pd.to_numeric(df[column]).to_numpy()
+        return bars
+
+    @staticmethod
+    def to_frame(bars):
+        """将K线数组转换为与原接口一致的 DataFrame"""
+        dates = bars['date'].astype(str)
+        return pd.DataFrame({
+            'trade_date': [f"{d[:4]}-{d[4:6]}-{d[6:]}" for d in dates],
+            'open': bars['open'],
+            'close': bars['close'],
+            'high': bars['high'],
+            'low': bars['low'],
+            'vol': bars['vol'],
+        })
+
+
+def _to_int_date(value):
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(value.strftime('%Y%m%d'))
@@ -4,24 +4,85 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                            QTableWidget, QTableWidgetItem, QMessageBox,
                            QDialog, QListWidget, QDialogButtonBox, 
                            QComboBox, QMenu, QMenuBar, QTabWidget, QDateTimeEdit)
-from PySide6.QtCore import QTimer, QDateTime, Qt
-from models import Session, Trade
-from stock_service import StockService
+from PySide6.QtCore import QTimer, QDateTime, Qt, Signal
+from models import Session, Trade, lowest_active_trades
+from stock_service import StockService, QuoteStream
+from eastmoney_stream import EastmoneyStream
+from market_calendar import is_trading_time, is_trading_day
 from cloud_sync import CloudSync
+from poll_scheduler import PollScheduler
+from quote_worker import QuoteWorker
+from rate_limiter import PRIORITY_BACKGROUND
+from target_engine import recompute_targets
+from alert_index import AlertIndex
+from trade_book import TradeBook
+from trade_ledger import TradeLedger, replay
+from tick_recorder import TickRecorder
 from datetime import datetime
+import json
+import os
+import time
+
+# 关闭窗口时等待后台线程结束的总秒数
+SHUTDOWN_TIMEOUT = 3
 
 class TradeApp(QMainWindow):
+    # 订阅回调在后台线程中触发，通过信号排队回到界面线程
+    alert_ticks = Signal(object)
+    table_ticks = Signal(object)
+    trade_changes = Signal(object, bool)
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("交易记录软件")
         self.setGeometry(100, 100, 800, 600)
         
         self.session = Session()
+        # 活跃交易的内存副本，监控和主表不再查询数据库
+        self.trade_book = TradeBook()
+        # 交易的创建、修改、关闭记入只追加的账本，备份时只上传新事件
+        self.trade_ledger = TradeLedger(
+            os.getenv('TRADE_LEDGER_DIR', 'trade_ledger'),
+            snapshot_every=int(os.getenv('TRADE_LEDGER_SNAPSHOT_EVERY', '500'))
+        )
         self.stock_service = StockService()
         self.cloud_sync = CloudSync()
+        # 所有行情网络请求都在后台执行
+        self.quote_worker = QuoteWorker(parent=self)
+        # 价格提醒和主表共享同一份行情订阅，每轮只请求一次
+        self.quote_stream = QuoteStream(self.stock_service)
+        self.monitored_trades = {}  # 股票代码 -> 主表显示的交易
+        self.table_rows = {}        # 股票代码 -> 主表行号
+        # 所有活跃交易的目标价格，每个价格只检查被穿越的目标
+        self.alert_index = AlertIndex()
+        self.alert_names = {}       # 交易ID -> 股票名称
+        # 交易变化时增量更新提醒索引，提交事务的线程不一定是界面线程
+        self.trade_changes.connect(self.apply_trade_changes)
+        self.trade_book.subscribe(self.trade_changes.emit)
+        self.apply_trade_changes({r.id: r for r in self.trade_book.records()}, True)
+        self.targets_day = None     # 最近一次重算目标价格的交易日
+        self.alert_ticks.connect(self.handle_alert_ticks)
+        self.table_ticks.connect(self.handle_table_ticks)
+        self.alert_subscription = self.quote_stream.subscribe(callback=self.alert_ticks.emit)
+        self.table_subscription = self.quote_stream.subscribe(callback=self.table_ticks.emit)
+        # 所有行情事件按天记录到本地文件，供分时图和盘后分析使用
+        self.tick_recorder = None
+        self.tick_subscription = None
+        if os.getenv('TICK_RECORD', '1') == '1':
+            self.tick_recorder = TickRecorder(os.getenv('TICK_DATA_DIR', 'tick_data'))
+            self.tick_subscription = self.quote_stream.subscribe(callback=self.tick_recorder.record)
+        # 交易时段内通过东方财富推送接收行情，推送正常的股票不再轮询
+        self.push_stream = None
+        if os.getenv('QUOTE_PUSH', '1') == '1':
+            self.push_stream = EastmoneyStream(
+                self.quote_stream, self.stock_service.http,
+                base_url=os.getenv('EASTMONEY_STREAM_URL', 'https://push2.eastmoney.com'),
+                batch_size=int(os.getenv('EASTMONEY_STREAM_BATCH', '50'))
+            )
         
         self.init_ui()
         self.setup_timer()
+        self.setup_metrics()
         
     def init_ui(self):
         # 创建主界面
@@ -80,10 +141,10 @@ class TradeApp(QMainWindow):
         
         # 交易列表
         self.trade_table = QTableWidget()
-        self.trade_table.setColumnCount(8)
+        self.trade_table.setColumnCount(9)
         self.trade_table.setHorizontalHeaderLabels([
             "股票代码", "股票名称", "买入价格", "买入时间", 
-            "卖出目标", "买入目标", "状态", "操作"
+            "卖出目标", "买入目标", "现价", "状态", "操作"
         ])
         layout.addWidget(self.trade_table)
         
@@ -101,6 +162,13 @@ class TradeApp(QMainWindow):
         button_layout.addWidget(export_button)
         layout.addLayout(button_layout)
         
+        # 状态栏显示进行中的请求和行情源健康状态
+        self.request_status = QLabel()
+        self.statusBar().addWidget(self.request_status)
+        self.provider_status = QLabel()
+        self.statusBar().addPermanentWidget(self.provider_status)
+        self.quote_worker.in_flight_changed.connect(self.update_request_status)
+        
         # 创建菜单栏
         self.create_menu_bar()
         
@@ -133,35 +201,114 @@ class TradeApp(QMainWindow):
         self.cloud_sync.show_settings_dialog(self)
         
     def setup_timer(self):
+        # 按交易时段调度轮询，休市期间休眠到下次开盘
+        self.poll_scheduler = PollScheduler(
+            base_interval=float(os.getenv('POLL_INTERVAL', '60')),
+            edge_interval=float(os.getenv('POLL_EDGE_INTERVAL', '20')),
+            near_interval=float(os.getenv('POLL_NEAR_INTERVAL', '10')),
+            near_ratio=float(os.getenv('POLL_NEAR_RATIO', '0.01'))
+        )
+        self.polling = False  # 后台是否有一轮轮询未结束
         self.timer = QTimer()
+        self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.check_prices)
-        self.timer.start(60000)  # 每分钟检查一次
+        self.timer.start(1000)
+        
+        # 证券代码表过期后在后台整体刷新
+        self.instrument_timer = QTimer()
+        self.instrument_timer.timeout.connect(self.refresh_instruments)
+        self.instrument_timer.start(6 * 3600 * 1000)
+        self.refresh_instruments()
+        
+    def setup_metrics(self):
+        """设置端口或文件后对外提供监控指标"""
+        metrics = self.stock_service.metrics
+        port = int(os.getenv('METRICS_PORT', '0'))
+        if port:
+            try:
+                metrics.start_http_server(port)
+            except OSError as e:
+                print(f"启动监控指标服务失败: {e}")
+        json_path = os.getenv('METRICS_JSON_PATH')
+        if json_path:
+            metrics.start_json_dump(json_path, float(os.getenv('METRICS_JSON_INTERVAL', '60')))
+            
+    def refresh_instruments(self):
+        """在后台刷新证券代码表和过期的股票信息缓存"""
+        if self.stock_service.instrument_master.is_stale():
+            self.quote_worker.submit('instruments', self.stock_service.refresh_instruments,
+                                     priority=PRIORITY_BACKGROUND)
+        if self.stock_service.stock_meta.stale():
+            self.quote_worker.submit('stock_meta', self.stock_service.refresh_stock_meta,
+                                     priority=PRIORITY_BACKGROUND)
+            
+    def update_request_status(self):
+        """在状态栏显示进行中的后台请求"""
+        names = {
+            'poll': '行情', 'search': '搜索', 'search_prices': '搜索结果价格',
+            'add_trade': '股票信息', 'selection_price': '股票价格', 'instruments': '证券代码表',
+            'stock_meta': '股票信息缓存'
+        }
+        kinds = self.quote_worker.in_flight()
+        if kinds:
+            self.request_status.setText("正在获取: " + "、".join(names.get(kind, kind) for kind in kinds))
+        else:
+            self.request_status.setText("")
         
     def add_trade(self):
         try:
             stock_code = self.stock_code.text()
-            stock_info = self.stock_service.get_stock_info(stock_code)
-            if not stock_info:
+            # 在界面线程读取表单，网络请求交给后台
+            form = {
+                'buy_price': float(self.buy_price.text()),
+                # 直接从主界面的时间控件获取买入时间
+                'buy_time': self.buy_time_edit.dateTime().toPython(),
+                'sell_condition': float(self.sell_condition.text())/100,
+                'buy_step': float(self.buy_step.text())/100
+            }
+            # 已知股票直接使用缓存的名称和价格精度，不访问网络；买入价格为0时需要获取现价
+            need_price = form['buy_price'] == 0
+            stock_info = None if need_price else self.stock_service.get_stock_info(stock_code, network=False)
+            if stock_info:
+                self.finish_add_trade(stock_code, form, (stock_info, (None, stock_info['price_precision'])))
+                return
+            self.quote_worker.submit(
+                'add_trade', self.fetch_trade_quote, stock_code, need_price,
+                on_done=lambda result: self.finish_add_trade(stock_code, form, result),
+                on_error=lambda e: QMessageBox.warning(self, "错误", str(e))
+            )
+        except Exception as e:
+            QMessageBox.warning(self, "错误", str(e))
+            
+    def fetch_trade_quote(self, stock_code, need_price):
+        """在后台获取股票信息，需要时获取实时价格，无法获取股票信息时返回None"""
+        stock_info = self.stock_service.get_stock_info(stock_code)
+        if not stock_info:
+            return None
+        if need_price:
+            return stock_info, self.stock_service.get_realtime_price(stock_code)
+        return stock_info, (None, stock_info.get('price_precision', 2))
+            
+    def finish_add_trade(self, stock_code, form, result):
+        """股票信息返回后保存交易"""
+        try:
+            if not result:
                 QMessageBox.warning(self, "错误", "无法获取股票信息")
                 return
+            stock_info, (price, precision) = result
             
-            # 获取实时价格和精度
-            price, precision = self.stock_service.get_realtime_price(stock_code)
             if not price:
-                # 如果无法获取实时价格，使用输入的价格
-                price = float(self.buy_price.text())
-                precision = 2  # 默认使用2位小数精度
-            
-            # 直接从主界面的时间控件获取买入时间
-            buy_time = self.buy_time_edit.dateTime().toPython()
+                # 没有实时价格时使用输入的价格和股票信息中的价格精度
+                price = form['buy_price']
+                precision = stock_info.get('price_precision', 2)
                 
             trade = Trade(
                 stock_code=stock_code,
                 stock_name=stock_info['name'],
-                buy_price=price if float(self.buy_price.text()) == 0 else float(self.buy_price.text()),
-                buy_time=buy_time,
-                sell_condition=float(self.sell_condition.text())/100,
-                buy_step=float(self.buy_step.text())/100,
+                buy_price=price if form['buy_price'] == 0 else form['buy_price'],
+                buy_time=form['buy_time'],
+                sell_condition=form['sell_condition'],
+                buy_step=form['buy_step'],
                 price_precision=precision
             )
             trade.calculate_targets()
@@ -179,23 +326,20 @@ class TradeApp(QMainWindow):
             QMessageBox.warning(self, "错误", str(e))
             
     def refresh_table(self):
-        # 查询所有活跃交易
-        all_trades = self.session.query(Trade).filter_by(is_active=True).all()
-        
-        # 按股票代码分组，只保留每支股票买入价最低的记录
-        lowest_price_trades = {}
-        for trade in all_trades:
-            if trade.stock_code not in lowest_price_trades:
-                lowest_price_trades[trade.stock_code] = trade
-            else:
-                if trade.buy_price < lowest_price_trades[trade.stock_code].buy_price:
-                    lowest_price_trades[trade.stock_code] = trade
-        
-        # 转换为列表
-        trades = list(lowest_price_trades.values())
+        # 每支股票只显示买入价最低的活跃交易；交易表没能从数据库读入时直接查询数据库
+        if not self.trade_book.loaded:
+            self.trade_book.load()
+        if self.trade_book.loaded:
+            trades = self.trade_book.lowest()
+        else:
+            trades = lowest_active_trades(self.session)
         
         # 设置表格行数
         self.trade_table.setRowCount(len(trades))
+        self.monitored_trades = {trade.stock_code: trade for trade in trades}
+        if not self.trade_book.loaded:
+            self.sync_alert_index()
+        self.table_rows = {trade.stock_code: i for i, trade in enumerate(trades)}
         
         for i, trade in enumerate(trades):
             # 获取价格精度
@@ -208,7 +352,8 @@ class TradeApp(QMainWindow):
             self.trade_table.setItem(i, 3, QTableWidgetItem(trade.buy_time.strftime('%Y-%m-%d %H:%M')))
             self.trade_table.setItem(i, 4, QTableWidgetItem(price_format.format(trade.sell_target)))
             self.trade_table.setItem(i, 5, QTableWidgetItem(price_format.format(trade.buy_target)))
-            self.trade_table.setItem(i, 6, QTableWidgetItem("活跃"))
+            self.trade_table.setItem(i, 6, QTableWidgetItem(""))
+            self.trade_table.setItem(i, 7, QTableWidgetItem("活跃"))
             
             # 创建按钮布局，包含删除和详情按钮
             button_widget = QWidget()
@@ -227,29 +372,131 @@ class TradeApp(QMainWindow):
             button_layout.addWidget(delete_button)
             button_layout.addWidget(detail_button)
             
-            self.trade_table.setCellWidget(i, 7, button_widget)
+            self.trade_table.setCellWidget(i, 8, button_widget)
+            
+        # 订阅主表中的股票，已有价格的股票会立即填入现价
+        self.alert_subscription.set_symbols(self.monitored_trades)
+        self.table_subscription.set_symbols(self.monitored_trades)
+        if self.tick_subscription:
+            self.tick_subscription.set_symbols(self.monitored_trades)
             
     def check_prices(self):
-        # 只检查主表显示的交易（每支股票最低价格的那条）
-        trades = self.session.query(Trade).filter_by(is_active=True).all()
-        
-        # 按股票代码分组，只保留每支股票买入价最低的记录
-        lowest_price_trades = {}
-        for trade in trades:
-            if trade.stock_code not in lowest_price_trades:
-                lowest_price_trades[trade.stock_code] = trade
-            else:
-                if trade.buy_price < lowest_price_trades[trade.stock_code].buy_price:
-                    lowest_price_trades[trade.stock_code] = trade
-                    
-        # 只检查这些交易的价格
-        for trade in lowest_price_trades.values():
-            result = self.stock_service.check_price_targets(trade)
-            if result:
-                # 使用InfoBar替代消息框
-                QMessageBox.information(self, "价格提醒", f"{trade.stock_name}({trade.stock_code}) 达到{result}目标价格！")
+        now = datetime.now()
+        self.roll_targets(now)
+        codes = sorted(self.quote_stream.symbols())
+        try:
+            live = set()
+            if self.push_stream:
+                if is_trading_time(now):
+                    self.push_stream.set_symbols(codes)
+                    live = self.push_stream.live_symbols()
+                else:
+                    self.push_stream.stop()
+            # 只请求推送未覆盖且到了轮询时间的股票，在后台一次批量获取价格；
+            # 上一轮还没结束时不再提交，等它结束后由下一次检查补上
+            polled = [code for code in codes if code not in live]
+            due = self.poll_scheduler.due_symbols(polled, now)
+            if due and not self.polling:
+                self.polling = True
+                started = time.monotonic()
+                self.quote_worker.submit(
+                    'poll', self.quote_stream.poll, due,
+                    on_done=lambda quotes: self.finish_poll(started, now, due, quotes),
+                    on_error=lambda error: self.finish_poll(started, now, due, {}),
+                    priority=PRIORITY_BACKGROUND
+                )
+        except Exception as e:
+            print(f"检查价格出错: {e}")
+            polled = codes
+        
+        # 安排下一次检查，推送覆盖的股票不参与计算
+        delay = self.poll_scheduler.next_delay(polled)
+        self.timer.start(int(delay * 1000))
+        
+    def roll_targets(self, now):
+        """每个交易日第一次检查价格前，按新的持有天数重算所有目标价格"""
+        if not is_trading_day(now) or self.targets_day == now.date():
+            return
+        try:
+            count = recompute_targets(self.session.connection(), now)
+            self.session.commit()
+            self.targets_day = now.date()
+            if count:
+                # 批量更新不经过会话事件，重新读入交易表
+                self.trade_book.load()
+                self.refresh_table()
+        except Exception as e:
+            self.session.rollback()
+            print(f"重算目标价格失败: {e}")
+        
+    def finish_poll(self, started, polled_at, due, quotes):
+        """一轮价格检查结束，没拿到价格的股票按退避间隔重试"""
+        self.polling = False
+        self.poll_scheduler.mark_polled(list(quotes), polled_at)
+        self.poll_scheduler.mark_failed([code for code in due if code not in quotes], polled_at)
+        self.stock_service.metrics.observe('poll_cycle_duration_seconds', time.monotonic() - started)
+        self.update_provider_status()
+        
+    def sync_alert_index(self):
+        """交易表没能从数据库读入时，按数据库中的活跃交易整体同步提醒索引"""
+        records = self.session.query(Trade).filter(Trade.is_active == True).all()  # noqa: E712
+        hits = self.alert_index.sync((r.id, r.stock_code, r.sell_target, r.buy_target) for r in records)
+        self.alert_names = {r.id: r.stock_name for r in records}
+        self.show_alerts(hits)
+        
+    def apply_trade_changes(self, changes, reloaded):
+        """交易变化后增量更新提醒索引，新加入或修改的目标已被当前价格越过时立即提醒"""
+        if reloaded:
+            hits = self.alert_index.sync((r.id, r.stock_code, r.sell_target, r.buy_target)
+                                         for r in changes.values())
+            self.alert_names = {r.id: r.stock_name for r in changes.values()}
+        else:
+            removed = [trade_id for trade_id, r in changes.items() if r is None]
+            updated = [r for r in changes.values() if r is not None]
+            hits = self.alert_index.apply(((r.id, r.stock_code, r.sell_target, r.buy_target) for r in updated),
+                                          removed)
+            for trade_id in removed:
+                self.alert_names.pop(trade_id, None)
+            self.alert_names.update((r.id, r.stock_name) for r in updated)
+        self.show_alerts(hits)
+        
+    def handle_alert_ticks(self, ticks):
+        """价格变化时检查穿越的目标"""
+        for tick in ticks:
+            if tick.stock_code not in self.monitored_trades:
+                continue
+            sell_target, buy_target = self.alert_index.nearest(tick.stock_code, tick.price)
+            self.poll_scheduler.update_symbol(tick.stock_code, tick.price, sell_target, buy_target)
+            sell_ids, buy_ids = self.alert_index.update(tick.stock_code, tick.price)
+            self.show_alerts({tick.stock_code: (sell_ids, buy_ids)})
+            
+    def show_alerts(self, hits):
+        """提醒达到目标的交易，hits 为 {股票代码: (卖出交易ID, 买入交易ID)}"""
+        for stock_code, (sell_ids, buy_ids) in hits.items():
+            if not sell_ids and not buy_ids:
+                continue
+            name = self.alert_names.get((sell_ids or buy_ids)[0], '')
+            result = "、".join(kind for kind, ids in (("卖出", sell_ids), ("买入", buy_ids)) if ids)
+            count = len(sell_ids) + len(buy_ids)
+            suffix = f"（{count}笔交易）" if count > 1 else ""
+            # 使用InfoBar替代消息框
+            QMessageBox.information(self, "价格提醒", f"{name}({stock_code}) 达到{result}目标价格！{suffix}")
+                
+    def handle_table_ticks(self, ticks):
+        """价格变化时更新主表现价"""
+        for tick in ticks:
+            row = self.table_rows.get(tick.stock_code)
+            if row is None:
+                continue
+            self.trade_table.setItem(row, 6, QTableWidgetItem(f"{tick.price:.{tick.precision}f}"))
+        
+    def update_provider_status(self):
+        """在状态栏显示行情源的成功率、延迟和熔断状态"""
+        summary = self.stock_service.providers.summary('quotes')
+        self.provider_status.setText(f"行情源: {summary}" if summary else "")
                 
-    def delete_trade(self, trade):
+    def delete_trade(self, record):
+        trade = self.session.get(Trade, record.id)
         trade.is_active = False
         self.session.commit()
         self.refresh_table()
@@ -271,10 +518,54 @@ class TradeApp(QMainWindow):
         target_name = "OneDrive" if self.cloud_sync.backup_target == "onedrive" else "WebDAV"
         
         if self.cloud_sync.backup_data(data, parent_widget=self):
+            self.backup_ledger()
             QMessageBox.information(self, "成功", f"数据成功备份到{target_name}")
         else:
             QMessageBox.warning(self, "错误", f"备份到{target_name}失败")
             
+    def backup_ledger(self):
+        """上传交易账本：第一次上传最新快照，之后只上传上次备份之后新增的事件"""
+        last = self.trade_ledger.backed_up_seq()
+        if last is None:
+            snapshot = self.trade_ledger.latest_snapshot()
+            if snapshot is None:
+                return
+            content = json.dumps(snapshot, ensure_ascii=False) + '\n'
+            if not self.cloud_sync.backup_data(content, filename=f"ledger_{snapshot['seq']:010d}_snapshot.jsonl"):
+                return
+            last = snapshot['seq']
+            self.trade_ledger.mark_backed_up(last)
+        events = self.trade_ledger.events_since(last)
+        if not events:
+            return
+        first, end = events[0]['seq'], events[-1]['seq']
+        content = ''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in events)
+        if self.cloud_sync.backup_data(content, filename=f'ledger_{first:010d}_{end:010d}.jsonl'):
+            self.trade_ledger.mark_backed_up(end)
+            
+    def restore_ledger(self, source):
+        """下载账本的最新快照和之后各次备份的事件，重放得到所有交易的字段，没有账本备份时返回None"""
+        files = sorted(self.cloud_sync.get_backup_files(from_source=source, parent_widget=self, suffix='.jsonl'))
+        snapshots = [name for name in files if name.endswith('_snapshot.jsonl')]
+        if not snapshots:
+            return None
+        text = self.cloud_sync.restore_data(snapshots[-1], from_source=source, parent_widget=self, raw=True)
+        if text is None:
+            return None
+        snapshot = json.loads(text)
+        events = []
+        for name in files:
+            if name.endswith('_snapshot.jsonl'):
+                continue
+            # 文件名为 ledger_起始序号_结束序号.jsonl，跳过快照之前的事件
+            if int(name[:-len('.jsonl')].split('_')[2]) <= snapshot['seq']:
+                continue
+            text = self.cloud_sync.restore_data(name, from_source=source, parent_widget=self, raw=True)
+            if text is None:
+                return None
+            events.extend(json.loads(line) for line in text.splitlines() if line.strip())
+        return [dict(fields, id=int(trade_id)) for trade_id, fields in replay(snapshot, events).items()]
+            
     def restore_data(self):
         """从云存储恢复数据"""
         try:
@@ -311,7 +602,8 @@ class TradeApp(QMainWindow):
             
             # 获取备份文件列表
             backup_files = self.cloud_sync.get_backup_files(from_source=source, parent_widget=self)
-            if not backup_files:
+            if not backup_files and not self.cloud_sync.get_backup_files(from_source=source, parent_widget=self,
+                                                                         suffix='.jsonl'):
                 QMessageBox.warning(self, "错误", f"在{restore_source.currentText()}中未找到备份文件")
                 return
             
@@ -321,6 +613,9 @@ class TradeApp(QMainWindow):
             file_layout = QVBoxLayout(file_dialog)
             
             file_list = QListWidget()
+            # 交易账本按快照加事件恢复，保留交易ID和价格精度
+            ledger_item = "交易账本（最新快照+之后的事件）"
+            file_list.addItem(ledger_item)
             for file in backup_files:
                 file_list.addItem(file)
             
@@ -334,7 +629,10 @@ class TradeApp(QMainWindow):
             
             if file_dialog.exec() == QDialog.DialogCode.Accepted and file_list.currentItem():
                 selected_file = file_list.currentItem().text()
-                data = self.cloud_sync.restore_data(selected_file, from_source=source, parent_widget=self)
+                if selected_file == ledger_item:
+                    data = self.restore_ledger(source)
+                else:
+                    data = self.cloud_sync.restore_data(selected_file, from_source=source, parent_widget=self)
                 
                 if data:
                     # 确认是否要覆盖现有数据
@@ -342,12 +640,17 @@ class TradeApp(QMainWindow):
                                                "恢复将覆盖现有数据，确定要继续吗？",
                                                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
                     if confirm == QMessageBox.StandardButton.Yes:
-                        # 清除现有数据
-                        self.session.query(Trade).delete()
+                        # 清除现有数据，逐条删除以便记入交易账本
+                        for trade in self.session.query(Trade).all():
+                            self.session.delete(trade)
+                        # 账本恢复的交易沿用原来的ID，先删除再插入
+                        self.session.flush()
                         
                         # 添加恢复的数据
                         for item in data:
                             trade = Trade(
+                                id=item.get('id'),
+                                price_precision=item.get('price_precision', 2),
                                 stock_code=item['stock_code'],
                                 stock_name=item['stock_name'],
                                 buy_price=item['buy_price'],
@@ -375,15 +678,21 @@ class TradeApp(QMainWindow):
         
     def search_stock(self):
         """搜索股票并让用户选择"""
+        search_text = self.stock_code.text().strip()
+        if not search_text:
+            QMessageBox.warning(self, "提示", "请输入股票代码或名称进行搜索")
+            return
+        
+        # 在后台搜索股票，结果返回后显示选择对话框
+        self.quote_worker.submit(
+            'search', self.stock_service.search_stocks, search_text,
+            on_done=self.show_search_results,
+            on_error=lambda e: QMessageBox.warning(self, "错误", f"搜索股票出错: {str(e)}")
+        )
+        
+    def show_search_results(self, results):
+        """显示搜索结果让用户选择"""
         try:
-            search_text = self.stock_code.text().strip()
-            if not search_text:
-                QMessageBox.warning(self, "提示", "请输入股票代码或名称进行搜索")
-                return
-            
-            # 搜索股票
-            results = self.stock_service.search_stocks(search_text)
-            
             if not results:
                 QMessageBox.information(self, "提示", "未找到匹配的股票")
                 return
@@ -402,8 +711,8 @@ class TradeApp(QMainWindow):
             
             # 创建表格
             table = QTableWidget()
-            table.setColumnCount(3)
-            table.setHorizontalHeaderLabels(["代码", "名称", "行业"])
+            table.setColumnCount(4)
+            table.setHorizontalHeaderLabels(["代码", "名称", "行业", "现价"])
             table.setRowCount(len(results))
             
             for i, stock in enumerate(results):
@@ -419,6 +728,7 @@ class TradeApp(QMainWindow):
                 table.setItem(i, 0, item_code)
                 table.setItem(i, 1, item_name)
                 table.setItem(i, 2, item_industry)
+                table.setItem(i, 3, QTableWidgetItem(self.format_price(stock) or "..."))
                 
                 # 保存完整的股票信息作为表格项的数据
                 table.item(i, 0).setData(Qt.ItemDataRole.UserRole, stock)
@@ -442,12 +752,36 @@ class TradeApp(QMainWindow):
                 550, 400
             )
             
+            # 在后台批量获取价格，价格到达后填入表格
+            self.quote_worker.submit(
+                'search_prices', self.stock_service.fill_prices, results,
+                on_done=lambda quotes: self.update_search_prices(results, table)
+            )
+            
             # 显示对话框
             dialog.exec()
+            # 对话框关闭后不再需要价格
+            self.quote_worker.cancel('search_prices')
             
         except Exception as e:
             QMessageBox.warning(self, "错误", f"搜索股票出错: {str(e)}")
     
+    def update_search_prices(self, results, table):
+        """批量价格返回后更新搜索结果表格"""
+        for i, stock in enumerate(results):
+            item = table.item(i, 3)
+            if item is not None:
+                item.setText(self.format_price(stock) or "-")
+        table.resizeColumnsToContents()
+    
+    def format_price(self, stock):
+        """按价格精度格式化搜索结果中的当前价格，没有价格时返回空字符串"""
+        price = stock.get('current_price')
+        if not price:
+            return ''
+        precision = stock.get('price_precision', 2)
+        return f"{price:.{precision}f}"
+        
     def handle_stock_selection(self, stock, dialog):
         """处理股票选择事件"""
         try:
@@ -461,18 +795,16 @@ class TradeApp(QMainWindow):
             
             # 尝试获取当前价格，如果stock中有current_price则使用
             price = stock.get('current_price')
-            precision = 2  # 默认精度
-            
-            if not price or price <= 0:
-                try:
-                    price, precision = self.stock_service.get_realtime_price(ts_code)
-                except Exception as e:
-                    print(f"获取股票价格出错: {e}")
+            precision = stock.get('price_precision', 2)
             
             if price and price > 0:
-                # 根据精度格式化价格
-                price_format = f"{{:.{precision}f}}"
-                self.buy_price.setText(price_format.format(price))
+                self.set_buy_price(price, precision)
+            else:
+                # 价格还没有返回，在后台获取后再填入
+                self.quote_worker.submit(
+                    'selection_price', self.stock_service.get_realtime_price, ts_code,
+                    on_done=lambda quote: self.set_buy_price(*quote)
+                )
             
             dialog.accept()
         except Exception as e:
@@ -480,6 +812,13 @@ class TradeApp(QMainWindow):
             QMessageBox.warning(self, "错误", f"处理股票数据时出错: {str(e)}")
             # 不关闭对话框，让用户可以尝试选择其他股票
         
+    def set_buy_price(self, price, precision):
+        """按精度填入买入价格"""
+        if price and price > 0:
+            # 根据精度格式化价格
+            price_format = f"{{:.{precision}f}}"
+            self.buy_price.setText(price_format.format(price))
+        
     def export_data(self):
         """导出交易数据为CSV或Excel"""
         try:
@@ -752,6 +1091,22 @@ class TradeApp(QMainWindow):
                 active_window.close()
                 self.show_stock_detail(trade.stock_code)
 
+    def closeEvent(self, event):
+        """关闭窗口时在 SHUTDOWN_TIMEOUT 秒内等待后台请求结束"""
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        remaining = lambda: max(0.0, deadline - time.monotonic())
+        self.timer.stop()
+        if self.push_stream:
+            self.push_stream.stop()
+        # 先关闭连接和限速队列，进行中的请求尽快失败，不再等到超时
+        self.stock_service.close()
+        if not self.quote_worker.shutdown(int(remaining() * 1000)):
+            print("后台请求未在限定时间内结束")
+        self.stock_service.db_writer.stop(remaining())
+        if self.tick_recorder:
+            self.tick_recorder.close(remaining())
+        super().closeEvent(event)
+
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     window = TradeApp()
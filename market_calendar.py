@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+from datetime import datetime, date, time, timedelta
+
+try:
+    from chinese_calendar import is_holiday as _is_public_holiday
+except ImportError:  # 未安装chinese_calendar时没有内置数据的年份只排除周末
+    _is_public_holiday = None
+
+# 沪深北交易所周末以外的休市日，每年根据交易所休市安排公告更新
+MARKET_HOLIDAYS = {
+    # 2025年
+    date(2025, 1, 1),
+    date(2025, 1, 28), date(2025, 1, 29), date(2025, 1, 30), date(2025, 1, 31),
+    date(2025, 2, 3), date(2025, 2, 4),
+    date(2025, 4, 4),
+    date(2025, 5, 1), date(2025, 5, 2), date(2025, 5, 5),
+    date(2025, 6, 2),
+    date(2025, 10, 1), date(2025, 10, 2), date(2025, 10, 3),
+    date(2025, 10, 6), date(2025, 10, 7), date(2025, 10, 8),
+    # 2026年
+    date(2026, 1, 1), date(2026, 1, 2),
+    date(2026, 2, 16), date(2026, 2, 17), date(2026, 2, 18), date(2026, 2, 19),
+    date(2026, 2, 20), date(2026, 2, 23),
+    date(2026, 4, 6),
+    date(2026, 5, 1), date(2026, 5, 4), date(2026, 5, 5),
+    date(2026, 6, 19),
+    date(2026, 9, 25),
+    date(2026, 10, 1), date(2026, 10, 2), date(2026, 10, 5), date(2026, 10, 6), date(2026, 10, 7),
+}
+HOLIDAY_YEARS = {2025, 2026}  # MARKET_HOLIDAYS 已包含的年份
+
+# 补充休市日的配置文件，格式为 {"2027": ["2027-01-01", ...]}，列出的年份视为已有数据
+HOLIDAYS_PATH = os.getenv('MARKET_HOLIDAYS_PATH', 'market_holidays.json')
+
+_extra_holidays = None  # 年份 -> 配置文件中的休市日
+_warned_years = set()
+_holidays_lock = threading.Lock()
+
+# 交易时段（沪深北相同）
+CALL_AUCTION_OPEN = time(9, 15)   # 开盘集合竞价
+MORNING_OPEN = time(9, 30)
+MORNING_CLOSE = time(11, 30)
+AFTERNOON_OPEN = time(13, 0)
+AFTERNOON_CLOSE = time(15, 0)
+
+
+def _load_extra_holidays():
+    try:
+        with open(HOLIDAYS_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return {int(year): {date.fromisoformat(day) for day in days} for year, days in data.items()}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, AttributeError, TypeError) as e:
+        print(f"读取休市日配置 {HOLIDAYS_PATH} 失败: {e}")
+        return {}
+
+
+def _is_holiday(day):
+    """是否为周末以外的休市日
+
+    内置数据和配置文件都没有该年份时打印一次警告：安装了 chinese_calendar 时按法定节假日判断，
+    否则只排除周末，需要在配置文件中补充当年的休市安排。
+    """
+    global _extra_holidays
+    if day.year in HOLIDAY_YEARS:
+        return day in MARKET_HOLIDAYS
+    with _holidays_lock:
+        if _extra_holidays is None:
+            _extra_holidays = _load_extra_holidays()
+        if day.year in _extra_holidays:
+            return day in _extra_holidays[day.year]
+        warn = day.year not in _warned_years
+        _warned_years.add(day.year)
+    if warn:
+        source = '按 chinese_calendar 的法定节假日判断' if _is_public_holiday else '只排除周末'
+        print(f"警告: 没有{day.year}年的休市日数据，{source}，请在 {HOLIDAYS_PATH} 中补充")
+    if _is_public_holiday:
+        try:
+            return _is_public_holiday(day)
+        except NotImplementedError:  # chinese_calendar 也没有该年份的数据
+            pass
+    return False
+
+
+def is_trading_day(day):
+    """是否为交易日"""
+    if isinstance(day, datetime):
+        day = day.date()
+    return day.weekday() < 5 and not _is_holiday(day)
+
+
+def next_trading_day(day):
+    """下一个交易日（不含当天）"""
+    if isinstance(day, datetime):
+        day = day.date()
+    day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return day
+
+
+def previous_trading_day(day):
+    """上一个交易日（不含当天）"""
+    if isinstance(day, datetime):
+        day = day.date()
+    day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def market_phase(now=None):
+    """当前所处的交易阶段
+
+    返回 closed(非交易日), pre_open(开盘前), call_auction(开盘集合竞价),
+    morning(上午连续竞价), lunch(午间休市), afternoon(下午交易), after_close(收盘后)
+    """
+    now = now or datetime.now()
+    if not is_trading_day(now):
+        return 'closed'
+    t = now.time()
+    if t < CALL_AUCTION_OPEN:
+        return 'pre_open'
+    if t < MORNING_OPEN:
+        return 'call_auction'
+    if t < MORNING_CLOSE:
+        return 'morning'
+    if t < AFTERNOON_OPEN:
+        return 'lunch'
+    if t < AFTERNOON_CLOSE:
+        return 'afternoon'
+    return 'after_close'
+
+
+def is_trading_time(now=None):
+    """价格是否在变动（集合竞价和连续竞价时段）"""
+    return market_phase(now) in ('call_auction', 'morning', 'afternoon')
+
+
+def next_open(now=None):
+    """下一次价格开始变动的时间，当前已在交易时段内则返回 now"""
+    now = now or datetime.now()
+    phase = market_phase(now)
+    if phase in ('call_auction', 'morning', 'afternoon'):
+        return now
+    if phase == 'pre_open':
+        return datetime.combine(now.date(), CALL_AUCTION_OPEN)
+    if phase == 'lunch':
+        return datetime.combine(now.date(), AFTERNOON_OPEN)
+    return datetime.combine(next_trading_day(now), CALL_AUCTION_OPEN)
+
+
+def is_continuous_trading(now=None):
+    """是否处于连续竞价时段"""
+    return market_phase(now) in ('morning', 'afternoon')
+
+
+def next_continuous_open(now=None):
+    """下一次连续竞价开始的时间，当前已在连续竞价时段内则返回 now"""
+    now = now or datetime.now()
+    phase = market_phase(now)
+    if phase in ('morning', 'afternoon'):
+        return now
+    if phase in ('pre_open', 'call_auction'):
+        return datetime.combine(now.date(), MORNING_OPEN)
+    if phase == 'lunch':
+        return datetime.combine(now.date(), AFTERNOON_OPEN)
+    return datetime.combine(next_trading_day(now), MORNING_OPEN)
+
+
+def last_price_change(now=None):
+    """价格最后一次可能变动的时间，交易时段内返回 now
+
+    在此时间之后获取的行情或K线数据直到下次开盘前都不会变化。
+    """
+    now = now or datetime.now()
+    phase = market_phase(now)
+    if phase in ('call_auction', 'morning', 'afternoon'):
+        return now
+    if phase == 'lunch':
+        return datetime.combine(now.date(), MORNING_CLOSE)
+    if phase == 'after_close':
+        return datetime.combine(now.date(), AFTERNOON_CLOSE)
+    return datetime.combine(previous_trading_day(now), AFTERNOON_CLOSE)
@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 延迟直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRIC_HELP = {
+    'provider_requests_total': '行情源请求次数，按行情源、接口和结果划分',
+    'provider_request_duration_seconds': '行情源请求耗时',
+    'provider_fallbacks_total': '主行情源失败或超时后启用备用行情源的次数',
+    'poll_cycle_duration_seconds': '一轮价格检查从提交到结果返回的耗时',
+    'quote_cache_hits_total': '实时行情缓存命中次数',
+    'quote_cache_misses_total': '实时行情缓存未命中次数',
+    'provider_circuit_open': '行情源接口是否处于熔断状态',
+    'rate_limit_used_today': '各主机今日已发出的请求次数',
+    'rate_limit_waiting': '各主机因限速正在排队的请求数量',
+}
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """计数器和延迟直方图
+
+    指标按名称和标签（如行情源、接口、结果）记录，可输出为 Prometheus 文本格式，
+    或作为JSON定期写入文件。取值时才计算的指标（缓存命中、熔断状态）通过 add_gauge 注册。
+    """
+
+    def __init__(self, prefix='trade_', buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._counters = {}    # (名称, 标签) -> 数值
+        self._histograms = {}  # (名称, 标签) -> _Histogram
+        self._gauges = {}      # 名称 -> (类型, 取值函数)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+
+    def add_gauge(self, name, fn, kind='gauge'):
+        """注册取值时才计算的指标，fn 返回 {((标签, 值), ...): 数值}"""
+        self._gauges[name] = (kind, fn)
+
+    def snapshot(self):
+        """所有指标的当前值"""
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = [{'name': name, 'labels': dict(labels), 'count': h.count, 'sum': h.sum,
+                           'buckets': dict(zip([str(b) for b in h.buckets], h.counts))}
+                          for (name, labels), h in sorted(self._histograms.items())]
+        gauges = []
+        for name, (_, fn) in sorted(self._gauges.items()):
+            for labels, value in sorted(fn().items()):
+                gauges.append({'name': name, 'labels': dict(labels), 'value': value})
+        return {'time': time.time(), 'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def render_prometheus(self):
+        """Prometheus 文本格式"""
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {self.prefix}{name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {self.prefix}{name} {kind}")
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = [(key, list(h.counts), h.sum, h.count) for key, h in sorted(self._histograms.items())]
+        for (name, labels), value in counters:
+            describe(name, 'counter')
+            lines.append(f"{self.prefix}{name}{_label_text(labels)} {value}")
+        for (name, labels), counts, total, count in histograms:
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.prefix}{name}_bucket{_label_text(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.prefix}{name}_bucket{_label_text(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.prefix}{name}_sum{_label_text(labels)} {total}")
+            lines.append(f"{self.prefix}{name}_count{_label_text(labels)} {count}")
+        for name, (kind, fn) in sorted(self._gauges.items()):
+            describe(name, kind)
+            for labels, value in sorted(fn().items()):
+                lines.append(f"{self.prefix}{name}{_label_text(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def dump_json(self, path):
+        """把当前指标写入JSON文件"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def start_json_dump(self, path, interval=60):
+        """在后台线程中每隔 interval 秒写一次JSON文件"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.dump_json(path)
+                except OSError as e:
+                    print(f"写入监控指标失败: {e}")
+        threading.Thread(target=run, name='metrics-dump', daemon=True).start()
+
+    def start_http_server(self, port, host='127.0.0.1'):
+        """在后台线程中提供 /metrics 接口（Prometheus 文本格式）"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                payload = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+        return self._server.server_address[1]
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server = None
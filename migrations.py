@@ -0,0 +1,132 @@
+from datetime import datetime
+
+# 数据库结构版本管理
+#
+# 每个迁移是 (版本号, 说明, 函数)，函数接收数据库连接执行建表、加字段、建删索引等操作。
+# 启动时按版本号顺序执行尚未执行的迁移，全部在同一个事务中完成，任何一步失败都整体回滚。
+# 已执行的版本记录在 schema_version 表中。修改表结构时在 MIGRATIONS 末尾追加新迁移，
+# 不要修改已发布的迁移。
+
+
+def table_exists(conn, table):
+    row = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return row is not None
+
+
+def column_names(conn, table):
+    return [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")]
+
+
+def add_column(conn, table, column, definition):
+    """添加字段，字段已存在时跳过"""
+    if column not in column_names(conn, table):
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def create_index(conn, name, table, columns):
+    conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+
+
+def drop_index(conn, name):
+    conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+
+def _create_trades(conn):
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS trades (
+            id INTEGER NOT NULL,
+            stock_code VARCHAR(10) NOT NULL,
+            stock_name VARCHAR(50) NOT NULL,
+            buy_price FLOAT NOT NULL,
+            buy_time DATETIME NOT NULL,
+            sell_target FLOAT,
+            buy_target FLOAT,
+            sell_condition FLOAT,
+            buy_step FLOAT,
+            price_precision INTEGER DEFAULT 2,
+            is_active BOOLEAN,
+            created_at DATETIME,
+            updated_at DATETIME,
+            PRIMARY KEY (id)
+        )""")
+    # 早期版本的数据库没有价格精度字段（原 update_db.py）
+    add_column(conn, 'trades', 'price_precision', 'INTEGER DEFAULT 2')
+
+
+def _create_stock_meta(conn):
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS stock_meta (
+            ts_code VARCHAR(12) NOT NULL,
+            name VARCHAR(50) NOT NULL,
+            industry VARCHAR(50),
+            market VARCHAR(4),
+            price_precision INTEGER,
+            updated_at DATETIME,
+            PRIMARY KEY (ts_code)
+        )""")
+
+
+def _trade_indexes(conn):
+    # 主表：每支股票买入价最低的活跃交易；重算目标价格：所有活跃交易
+    create_index(conn, 'ix_trades_active_code_price', 'trades', ['is_active', 'stock_code', 'buy_price'])
+    # 股票详情：某支股票的全部交易
+    create_index(conn, 'ix_trades_stock_code', 'trades', ['stock_code'])
+
+
+MIGRATIONS = [
+    (1, '交易记录表', _create_trades),
+    (2, '股票信息缓存表', _create_stock_meta),
+    (3, '交易记录索引', _trade_indexes),
+]
+
+# 常用查询及其应使用的索引，用于检查索引是否生效
+HOT_QUERIES = [
+    ("SELECT id, stock_code, buy_price FROM trades WHERE is_active = 1", (),
+     'ix_trades_active_code_price'),
+    ("SELECT * FROM trades WHERE stock_code = ?", ('600000.SH',), 'ix_trades_stock_code'),
+]
+
+
+def current_version(conn):
+    if not table_exists(conn, 'schema_version'):
+        return 0
+    return conn.exec_driver_sql("SELECT COALESCE(MAX(version), 0) FROM schema_version").scalar()
+
+
+def migrate(engine):
+    """执行尚未执行的迁移，返回迁移后的版本号"""
+    with engine.begin() as conn:
+        # sqlite3 驱动不会为建表、建索引语句开启事务，显式开始才能整体回滚
+        conn.exec_driver_sql("BEGIN")
+        conn.exec_driver_sql("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER NOT NULL PRIMARY KEY,
+                description VARCHAR(100),
+                applied_at DATETIME
+            )""")
+        version = current_version(conn)
+        for number, description, apply in MIGRATIONS:
+            if number <= version:
+                continue
+            try:
+                apply(conn)
+            except Exception as e:
+                print(f"数据库迁移 {number}（{description}）失败: {e}")
+                raise
+            conn.exec_driver_sql(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (number, description, datetime.now().isoformat(sep=' ')))
+            version = number
+        return version
+
+
+def check_index_usage(engine):
+    """用 EXPLAIN QUERY PLAN 检查常用查询是否使用了索引，返回未使用索引的查询及其执行计划"""
+    problems = []
+    with engine.connect() as conn:
+        for sql, params, index in HOT_QUERIES:
+            plan = [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params)]
+            if not any(index in detail for detail in plan):
+                problems.append((sql, index, plan))
+    return problems
@@ -1,12 +1,21 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, DateTime, Boolean, Index, func
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
 from datetime import datetime
+import os
+import threading
+from migrations import migrate
 
 Base = declarative_base()
 
 class Trade(Base):
     __tablename__ = 'trades'
+    __table_args__ = (
+        # 查询每支股票买入价最低的活跃交易
+        Index('ix_trades_active_code_price', 'is_active', 'stock_code', 'buy_price'),
+        # 查询某支股票的全部交易
+        Index('ix_trades_stock_code', 'stock_code'),
+    )
     
     id = Column(Integer, primary_key=True)
     stock_code = Column(String(10), nullable=False)  # 股票代码
@@ -25,14 +34,96 @@ class Trade(Base):
     def calculate_targets(self):
         """计算卖出和买入目标价格"""
         days = max((datetime.now() - self.buy_time).days, 30)
-        print(f"变量值: {days} {self.sell_condition} {self.buy_step}") 
         # 计算卖出目标价格并使用指定精度
         precision = self.price_precision if hasattr(self, 'price_precision') and self.price_precision is not None else 2
         self.sell_target = round(self.buy_price * (1 + self.sell_condition * days/360), precision)
         # 计算买入目标价格并使用指定精度
         self.buy_target = round(self.sell_target * (1 - self.buy_step), precision)
 
-# 创建数据库连接
-engine = create_engine('sqlite:///trades.db')
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine) 
\ No newline at end of file
+class StockMeta(Base):
+    """股票基本信息缓存，添加交易时已知股票不再访问网络"""
+    __tablename__ = 'stock_meta'
+    
+    ts_code = Column(String(12), primary_key=True)   # 股票代码，如600000.SH
+    name = Column(String(50), nullable=False)        # 股票名称
+    industry = Column(String(50), default='')        # 所属行业
+    market = Column(String(4))                       # 市场: SH/SZ/BJ
+    price_precision = Column(Integer, default=2)     # 价格精度
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+def lowest_active_trades(session):
+    """每支股票买入价最低的活跃交易
+
+    买入价相同时取最早的记录，结果按每支股票最早一笔活跃交易的顺序排列。
+    """
+    ranked = (
+        session.query(
+            Trade.id.label('id'),
+            func.row_number().over(partition_by=Trade.stock_code,
+                                   order_by=(Trade.buy_price, Trade.id)).label('rank'),
+            func.min(Trade.id).over(partition_by=Trade.stock_code).label('first_id')
+        )
+        .filter(Trade.is_active == True)  # noqa: E712
+        .subquery()
+    )
+    return (
+        session.query(Trade)
+        .join(ranked, Trade.id == ranked.c.id)
+        .filter(ranked.c.rank == 1)
+        .order_by(ranked.c.first_id)
+        .all()
+    )
+
+# SQLite 连接参数：WAL 模式下后台写入不阻塞界面读取
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': -int(os.getenv('SQLITE_CACHE_KB', '16384')),  # 负数表示以KB为单位
+    'mmap_size': int(os.getenv('SQLITE_MMAP_MB', '64')) * 1024 * 1024,
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+}
+
+def create_db_engine(url='sqlite:///trades.db', **pragmas):
+    """创建数据库连接，每个新连接都设置 SQLITE_PRAGMAS，pragmas 可覆盖其中的项"""
+    settings = dict(SQLITE_PRAGMAS, **pragmas)
+    db_engine = create_engine(url)
+
+    @event.listens_for(db_engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in settings.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return db_engine
+
+# 数据库地址，默认为当前目录下的 trades.db
+DATABASE_URL = os.getenv('TRADE_DB_URL', 'sqlite:///trades.db')
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """数据库连接，第一次调用时创建并升级表结构，导入本模块不会创建数据库文件"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_db_engine(DATABASE_URL)
+            # 表结构由 migrations.py 按版本创建和升级
+            migrate(_engine)
+            Session.configure(bind=_engine)
+    return _engine
+
+
+class _LazySessionmaker(sessionmaker):
+    """第一次创建会话时才连接数据库"""
+
+    def __call__(self, **local_kw):
+        get_engine()
+        return super().__call__(**local_kw)
+
+
+Session = _LazySessionmaker()
+# 后台线程使用的会话，每个线程各自一个，不与界面线程的会话共享
+ScopedSession = scoped_session(Session)
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+from market_calendar import (is_continuous_trading, next_continuous_open,
+                             MORNING_OPEN, AFTERNOON_CLOSE)
+
+
+class PollScheduler:
+    """行情轮询调度
+
+    只在连续竞价时段轮询，休市期间（夜间、午休、周末和节假日）一直休眠到下次开盘；
+    开盘后和收盘前的一段时间加快轮询；价格接近卖出或买入目标的股票单独加快轮询。
+    没拿到价格的股票（停牌、请求失败）按 retry_interval 起步、每次翻倍的间隔重试，最长 max_retry_interval。
+    """
+
+    def __init__(self, base_interval=60, edge_interval=20, near_interval=10,
+                 near_ratio=0.01, edge_minutes=10, max_sleep=3600,
+                 retry_interval=5, max_retry_interval=300):
+        self.base_interval = base_interval
+        self.edge_interval = edge_interval    # 开盘后、收盘前的轮询间隔
+        self.near_interval = near_interval    # 价格接近目标时的轮询间隔
+        self.near_ratio = near_ratio          # 距目标价多少比例以内视为接近
+        self.edge_minutes = edge_minutes
+        self.max_sleep = max_sleep            # 单次休眠上限，防止系统休眠或改时间后错过开盘
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.last_polled = {}                 # 股票代码 -> 上次轮询时间
+        self.symbol_intervals = {}            # 股票代码 -> 根据价格计算的轮询间隔
+        self.overrides = {}                   # 股票代码 -> 手动指定的轮询间隔
+        self.retry_intervals = {}             # 股票代码 -> 上次没拿到价格后的重试间隔
+
+    def set_interval(self, stock_code, seconds):
+        """手动指定某只股票的轮询间隔，传入None取消"""
+        if seconds is None:
+            self.overrides.pop(stock_code, None)
+        else:
+            self.overrides[stock_code] = seconds
+
+    def session_interval(self, now):
+        """当前时段的基础轮询间隔"""
+        edge = timedelta(minutes=self.edge_minutes)
+        opened = datetime.combine(now.date(), MORNING_OPEN)
+        closing = datetime.combine(now.date(), AFTERNOON_CLOSE)
+        if now - opened < edge or closing - now <= edge:
+            return min(self.edge_interval, self.base_interval)
+        return self.base_interval
+
+    def interval(self, stock_code, now):
+        """某只股票当前的轮询间隔"""
+        if stock_code in self.retry_intervals:
+            return self.retry_intervals[stock_code]
+        if stock_code in self.overrides:
+            return self.overrides[stock_code]
+        return min(self.session_interval(now), self.symbol_intervals.get(stock_code, self.base_interval))
+
+    def update_symbol(self, stock_code, price, sell_target, buy_target):
+        """根据最新价格与目标价的距离调整股票的轮询间隔"""
+        near = False
+        for target in (sell_target, buy_target):
+            if price and target and abs(price - target) / target <= self.near_ratio:
+                near = True
+        self.symbol_intervals[stock_code] = self.near_interval if near else self.base_interval
+
+    def due_symbols(self, stock_codes, now=None):
+        """到了轮询时间的股票代码，休市期间返回空列表"""
+        now = now or datetime.now()
+        if not is_continuous_trading(now):
+            return []
+        due = []
+        for code in stock_codes:
+            last = self.last_polled.get(code)
+            if last is None or (now - last).total_seconds() >= self.interval(code, now):
+                due.append(code)
+        return due
+
+    def mark_polled(self, stock_codes, now=None):
+        now = now or datetime.now()
+        for code in stock_codes:
+            self.last_polled[code] = now
+            self.retry_intervals.pop(code, None)
+
+    def mark_failed(self, stock_codes, now=None):
+        """记录没拿到价格的股票，连续失败时重试间隔翻倍"""
+        now = now or datetime.now()
+        for code in stock_codes:
+            self.last_polled[code] = now
+            previous = self.retry_intervals.get(code)
+            self.retry_intervals[code] = (min(previous * 2, self.max_retry_interval) if previous
+                                          else self.retry_interval)
+
+    def next_delay(self, stock_codes, now=None):
+        """距下一次需要轮询的秒数"""
+        now = now or datetime.now()
+        if not is_continuous_trading(now):
+            wait = (next_continuous_open(now) - now).total_seconds()
+            return max(1, min(wait, self.max_sleep))
+        wait = self.session_interval(now)
+        for code in stock_codes:
+            last = self.last_polled.get(code)
+            if last is None:
+                return 1
+            wait = min(wait, self.interval(code, now) - (now - last).total_seconds())
+        return max(1, wait)
@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import deque
+
+PROVIDER_NAMES = {
+    'tencent': '腾讯',
+    'sina': '新浪',
+    'eastmoney': '东方财富',
+}
+
+ENDPOINT_NAMES = {
+    'quote': '实时行情',
+    'quotes': '批量行情',
+    'info': '股票信息',
+    'kline': '历史K线',
+    'search': '股票搜索',
+    'meta': '股票资料',
+}
+
+
+class EndpointHealth:
+    """单个行情源接口的健康状态
+
+    记录最近 horizon 秒内（最多 window 次）请求的成功与延迟，过期样本自动丢弃，
+    使被降级的行情源在一段时间后回到默认顺序；连续失败达到阈值后熔断，
+    熔断期间不再请求，冷却时间结束后进入半开状态，同一时间只放行一个请求试探，
+    试探成功则恢复，失败则再次熔断并加倍冷却时间。
+    """
+
+    def __init__(self, window=50, failure_threshold=3, cooldown=30, max_cooldown=300, horizon=300):
+        self.samples = deque(maxlen=window)  # (时间, 是否成功, 延迟秒数)
+        self.horizon = horizon
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.state = 'closed'  # closed 正常, open 熔断, half_open 半开试探
+        self.opened_at = 0.0
+        self.probe_at = None  # 半开状态下试探请求的放行时间，None 表示没有进行中的试探
+
+    def prune(self, now):
+        """丢弃超出统计时间窗口的样本"""
+        while self.samples and now - self.samples[0][0] > self.horizon:
+            self.samples.popleft()
+
+    def success_rate(self):
+        if not self.samples:
+            return 1.0
+        return sum(1 for _, ok, _ in self.samples if ok) / len(self.samples)
+
+    def avg_latency(self):
+        latencies = [latency for _, ok, latency in self.samples if ok]
+        return sum(latencies) / len(latencies) if latencies else 0.0
+
+    def score(self):
+        """健康评分，成功率越高、延迟越低分数越高"""
+        return self.success_rate() / (1 + self.avg_latency())
+
+    def available(self, now):
+        """是否允许请求，熔断冷却结束时转为半开状态
+
+        半开状态只放行一个试探请求，结果记录前其他请求继续跳过该行情源；
+        放行后超过冷却时间仍没有结果（如备用链没有用到该行情源）时重新放行。
+        """
+        if self.state == 'open' and now - self.opened_at >= self.cooldown:
+            self.state = 'half_open'
+            self.probe_at = None
+        if self.state == 'half_open':
+            if self.probe_at is not None and now - self.probe_at < self.cooldown:
+                return False
+            self.probe_at = now
+        return self.state != 'open'
+
+    def record(self, ok, latency, now):
+        """记录一次请求结果，返回状态是否发生变化"""
+        self.samples.append((now, ok, latency))
+        previous = self.state
+        self.probe_at = None
+        if ok:
+            self.consecutive_failures = 0
+            self.state = 'closed'
+            self.cooldown = self.base_cooldown
+        else:
+            self.consecutive_failures += 1
+            if self.state == 'half_open':
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self.state = 'open'
+                self.opened_at = now
+            elif self.state == 'closed' and self.consecutive_failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = now
+        return self.state != previous
+
+
+class ProviderRegistry:
+    """行情源健康登记表
+
+    按 (行情源, 接口) 统计滚动成功率和延迟，按健康度对备用链重新排序并跳过熔断中的行情源。
+    """
+
+    def __init__(self, window=50, failure_threshold=3, cooldown=30):
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._health = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def _get(self, provider, endpoint):
+        key = (provider, endpoint)
+        health = self._health.get(key)
+        if health is None:
+            health = EndpointHealth(self.window, self.failure_threshold, self.cooldown)
+            self._health[key] = health
+        return health
+
+    def add_listener(self, callback):
+        """注册状态变化回调，参数为 (行情源, 接口, 新状态)"""
+        self._listeners.append(callback)
+
+    def record(self, provider, endpoint, ok, latency):
+        """记录一次请求结果"""
+        with self._lock:
+            health = self._get(provider, endpoint)
+            changed = health.record(ok, latency, time.monotonic())
+            state = health.state
+            failures = health.consecutive_failures
+        if changed:
+            name = PROVIDER_NAMES.get(provider, provider) + ENDPOINT_NAMES.get(endpoint, endpoint)
+            if state == 'open':
+                print(f"{name}接口连续失败{failures}次，暂停使用")
+            else:
+                print(f"{name}接口已恢复")
+            for callback in self._listeners:
+                callback(provider, endpoint, state)
+
+    def order(self, endpoint, providers):
+        """按健康度排序行情源，跳过熔断中的行情源
+
+        评分按0.1取整后比较，差距不大时保持默认顺序，避免备用链频繁变化。
+        """
+        now = time.monotonic()
+        with self._lock:
+            ranked = []
+            for index, provider in enumerate(providers):
+                health = self._get(provider, endpoint)
+                health.prune(now)
+                if health.available(now):
+                    ranked.append((-round(health.score(), 1), index, provider))
+        return [provider for _, _, provider in sorted(ranked)]
+
+    def snapshot(self):
+        """所有接口当前的健康状态"""
+        now = time.monotonic()
+        with self._lock:
+            for health in self._health.values():
+                health.prune(now)
+            return [{
+                'provider': provider,
+                'endpoint': endpoint,
+                'state': health.state,
+                'success_rate': health.success_rate(),
+                'avg_latency': health.avg_latency(),
+                'samples': len(health.samples)
+            } for (provider, endpoint), health in sorted(self._health.items())]
+
+    def summary(self, endpoint):
+        """指定接口的状态摘要，用于界面显示"""
+        parts = []
+        for item in self.snapshot():
+            if item['endpoint'] != endpoint:
+                continue
+            name = PROVIDER_NAMES.get(item['provider'], item['provider'])
+            if item['state'] == 'open':
+                parts.append(f"{name} 熔断中")
+            else:
+                parts.append(f"{name} {item['success_rate']:.0%} {item['avg_latency'] * 1000:.0f}ms")
+        return ' | '.join(parts)
@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from market_calendar import is_trading_time, next_open
+
+# 收盘或午休后的一段时间内行情源可能仍在更新最终价格，继续使用短有效期
+SETTLE_SECONDS = 60
+
+
+class QuoteCache:
+    """实时行情缓存
+
+    每条记录有独立的过期时间，超过容量时淘汰最久未使用的记录。
+    交易时段内使用较短的有效期；午休、收盘后和休市日价格不会变化，
+    缓存一直有效到下一次开盘。
+    """
+
+    def __init__(self, max_size=2000, trading_ttl=5):
+        self.max_size = max_size
+        self.trading_ttl = trading_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (过期时间, 值)
+        self._lock = threading.Lock()
+
+    def expires_at(self, now):
+        """计算当前时刻写入的记录的过期时间"""
+        if is_trading_time(now) or is_trading_time(now - timedelta(seconds=SETTLE_SECONDS)):
+            return now + timedelta(seconds=self.trading_ttl)
+        return next_open(now)
+
+    def get(self, key, now=None):
+        """读取缓存，未命中或已过期返回None"""
+        now = now or datetime.now()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, now=None):
+        """写入缓存"""
+        now = now or datetime.now()
+        with self._lock:
+            self._entries[key] = (self.expires_at(now), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """删除指定记录，不指定时清空缓存"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
@@ -0,0 +1,72 @@
+from collections import namedtuple
+
+class Quote(namedtuple('Quote', ['code', 'raw_name', 'price', 'prev_close', 'open', 'volume', 'precision'])):
+    """一只股票的行情，code 为接口使用的代码（如 sh600000）
+
+    raw_name 为名称的原始GBK字节，访问 name 时才解码，批量行情中没用到的名称不解码。
+    """
+    __slots__ = ()
+
+    @property
+    def name(self):
+        return self.raw_name.decode('gbk', errors='replace') if self.raw_name is not None else None
+
+
+# 各接口行情行的格式: (行前缀, 分隔符, 名称, 最新价, 昨收, 今开, 成交量(股)的字段位置, 成交量倍数)
+# 腾讯: v_sh600000="1~浦发银行~600000~最新价~昨收~今开~成交量(手)~...";
+# 新浪: var hq_str_sh600000="浦发银行,今开,昨收,最新价,最高,最低,买一,卖一,成交量(股),...";
+TENCENT_FORMAT = (b'v_', b'~', 1, 3, 4, 5, 6, 100)
+SINA_FORMAT = (b'hq_str_', b',', 0, 3, 2, 1, 8, 1)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def _parse(payload, line_format, with_name):
+    """在原始字节上逐行定位，每行只切出前几个字段并转换需要的字段"""
+    prefix, sep, name_at, price_at, prev_at, open_at, volume_at, volume_unit = line_format
+    last = max(name_at, price_at, prev_at, open_at, volume_at)
+    find = payload.find
+    quotes = []
+    position = find(prefix)
+    while position >= 0:
+        code_start = position + len(prefix)
+        code_end = find(b'="', code_start)
+        if code_end < 0:
+            break
+        start = code_end + 2
+        end = find(b'"', start)
+        if end < 0:
+            break
+        position = find(prefix, end)
+        # 只切出前 last+1 个字段，行内其余部分不拆分
+        fields = payload[start:end].split(sep, last + 1)
+        # 空行或无效代码（如腾讯的 v_pv_none_match="1"）
+        if len(fields) <= last:
+            continue
+        price_bytes = fields[price_at]
+        dot = price_bytes.find(b'.')
+        quotes.append(Quote(
+            payload[code_start:code_end].decode('ascii'),
+            fields[name_at] if with_name else None,
+            _number(price_bytes),
+            _number(fields[prev_at]),
+            _number(fields[open_at]),
+            _number(fields[volume_at]) * volume_unit,
+            len(price_bytes) - dot - 1 if dot >= 0 else 0
+        ))
+    return quotes
+
+
+def parse_tencent(payload, with_name=False):
+    """解析腾讯行情接口返回的原始字节（可包含多只股票），返回 Quote 列表"""
+    return _parse(payload, TENCENT_FORMAT, with_name)
+
+
+def parse_sina(payload, with_name=False):
+    """解析新浪行情接口返回的原始字节（可包含多只股票），返回 Quote 列表"""
+    return _parse(payload, SINA_FORMAT, with_name)
@@ -0,0 +1,119 @@
+import threading
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from rate_limiter import PRIORITY_INTERACTIVE, request_priority
+
+
+class _Task(QRunnable):
+    """线程池中执行的一次请求"""
+
+    def __init__(self, worker, kind, request_id, fn, args, priority):
+        super().__init__()
+        # 由 QuoteWorker 持有引用，避免 tryTake 取回已被释放的任务
+        self.setAutoDelete(False)
+        self.worker = worker
+        self.kind = kind
+        self.request_id = request_id
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+
+    def run(self):
+        # 开始执行前已有同类新请求，直接放弃
+        if self.worker.is_stale(self.kind, self.request_id):
+            self._finish(None, None)
+            return
+        try:
+            with request_priority(self.priority):
+                result = self.fn(*self.args)
+            error = None
+        except Exception as e:
+            result = None
+            error = e
+        self._finish(result, error)
+
+    def _finish(self, result, error):
+        try:
+            self.worker._done.emit(self, result, error)
+        except RuntimeError:
+            # 关闭窗口时限时等待已结束，QuoteWorker 已释放，结果丢弃
+            pass
+
+
+class QuoteWorker(QObject):
+    """行情后台请求
+
+    StockService 的网络请求都在线程池中执行，结果通过信号回到界面线程再调用回调，
+    界面线程不会因为行情源缓慢而卡住。同一类请求只保留最新的一次：
+    提交新请求时，尚未开始的旧请求会被取消，已经在执行的旧请求结果会被丢弃。
+    请求按 priority 参与行情源限速排队，默认作为用户操作优先于后台轮询。
+    """
+
+    # 任务完成，参数为 (任务, 结果, 异常)，跨线程排队投递到界面线程
+    _done = Signal(object, object, object)
+    # 进行中的请求发生变化
+    in_flight_changed = Signal()
+
+    def __init__(self, max_threads=4, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._latest = {}      # 请求类别 -> 最新请求编号
+        self._callbacks = {}   # 任务 -> (完成回调, 失败回调)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._done.connect(self._dispatch)
+
+    def submit(self, kind, fn, *args, on_done=None, on_error=None, priority=PRIORITY_INTERACTIVE):
+        """提交请求，同类别的旧请求作废，返回请求编号"""
+        with self._lock:
+            self._next_id += 1
+            request_id = self._next_id
+            self._latest[kind] = request_id
+        # 取消还在排队的同类旧请求
+        for task in list(self._callbacks):
+            if task.kind == kind and self.pool.tryTake(task):
+                del self._callbacks[task]
+        task = _Task(self, kind, request_id, fn, args, priority)
+        self._callbacks[task] = (on_done, on_error)
+        self.pool.start(task)
+        self.in_flight_changed.emit()
+        return request_id
+
+    def cancel(self, kind):
+        """作废某类请求，已经在执行的请求结果会被丢弃"""
+        with self._lock:
+            self._next_id += 1
+            self._latest[kind] = self._next_id
+        for task in list(self._callbacks):
+            if task.kind == kind and self.pool.tryTake(task):
+                del self._callbacks[task]
+        self.in_flight_changed.emit()
+
+    def is_stale(self, kind, request_id):
+        with self._lock:
+            return self._latest.get(kind) != request_id
+
+    def in_flight(self):
+        """进行中且未作废的请求类别"""
+        return sorted({task.kind for task in self._callbacks
+                       if not self.is_stale(task.kind, task.request_id)})
+
+    def _dispatch(self, task, result, error):
+        """在界面线程中调用回调"""
+        on_done, on_error = self._callbacks.pop(task, (None, None))
+        self.in_flight_changed.emit()
+        if self.is_stale(task.kind, task.request_id):
+            return
+        if error is not None:
+            print(f"后台请求{task.kind}失败: {error}")
+            if on_error:
+                on_error(error)
+        elif on_done:
+            on_done(result)
+
+    def shutdown(self, timeout_ms=-1):
+        """取消排队的请求，最多等待 timeout_ms 毫秒让进行中的请求结束，返回是否全部结束"""
+        self.pool.clear()
+        return self.pool.waitForDone(timeout_ms)
@@ -0,0 +1,165 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+
+import requests
+
+# 请求优先级，数值越小越先获得令牌
+PRIORITY_INTERACTIVE = 0   # 用户操作（搜索、添加交易、查看详情）
+PRIORITY_BACKGROUND = 1    # 后台轮询、代码表刷新
+
+_local = threading.local()
+
+
+def current_priority():
+    """当前线程发出请求的优先级，未设置时按后台请求处理"""
+    return getattr(_local, 'priority', PRIORITY_BACKGROUND)
+
+
+@contextmanager
+def request_priority(level):
+    """在代码块内以指定优先级发出请求"""
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def bind_priority(fn):
+    """把当前线程的优先级带到线程池中执行的函数里"""
+    level = current_priority()
+
+    def run(*args, **kwargs):
+        with request_priority(level):
+            return fn(*args, **kwargs)
+    return run
+
+
+class RateLimitExceeded(requests.RequestException):
+    """超过每日请求预算或排队超时"""
+
+
+class TokenBucket:
+    """单个主机的令牌桶
+
+    令牌按 rate 个/秒持续补充，最多积累 burst 个；daily_budget 为每天最多请求次数，0 表示不限。
+    """
+
+    def __init__(self, rate, burst, daily_budget=0):
+        self.rate = rate
+        self.burst = burst
+        self.daily_budget = daily_budget
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.day = date.today()
+        self.used_today = 0
+        self.waiters = []  # 排队的 (优先级, 序号)
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        today = date.today()
+        if today != self.day:
+            self.day = today
+            self.used_today = 0
+
+    def budget_left(self):
+        return self.daily_budget <= 0 or self.used_today < self.daily_budget
+
+    def wait_time(self):
+        """距离下一个令牌可用的秒数"""
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else None
+
+
+class RateLimiter:
+    """按主机限制请求速率
+
+    令牌不足时请求排队等待而不是失败，队列按优先级排序，用户操作的请求排在后台轮询之前。
+    超过每日预算或排队超过 max_wait 秒时抛出 RateLimitExceeded，由调用方换用其他行情源。
+    """
+
+    def __init__(self, rate=5, burst=10, daily_budget=0, max_wait=30, overrides=None):
+        self.rate = rate
+        self.burst = burst
+        self.daily_budget = daily_budget
+        self.max_wait = max_wait
+        self.overrides = overrides or {}  # 主机 -> (rate, burst, daily_budget)
+        self._buckets = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    @staticmethod
+    def parse_overrides(text):
+        """解析 host=rate:burst[:budget],... 格式的单独配置"""
+        overrides = {}
+        for item in filter(None, (part.strip() for part in (text or '').split(','))):
+            host, _, values = item.partition('=')
+            fields = values.split(':')
+            overrides[host.strip()] = (float(fields[0]), int(fields[1]),
+                                       int(fields[2]) if len(fields) > 2 else 0)
+        return overrides
+
+    def _bucket(self, host):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate, burst, budget = self.overrides.get(host, (self.rate, self.burst, self.daily_budget))
+            bucket = self._buckets[host] = TokenBucket(rate, burst, budget)
+        return bucket
+
+    def acquire(self, host, priority=None):
+        """取得一个令牌，令牌不足时按优先级排队等待"""
+        if priority is None:
+            priority = current_priority()
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            bucket = self._bucket(host)
+            ticket = (priority, next(self._seq))
+            heapq.heappush(bucket.waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    bucket.refill(now)
+                    if self._closed:
+                        raise RateLimitExceeded(f"{host} 限速器已关闭")
+                    if not bucket.budget_left():
+                        raise RateLimitExceeded(f"{host} 已用完今日请求预算 {bucket.daily_budget} 次")
+                    if bucket.waiters[0] == ticket and bucket.tokens >= 1:
+                        bucket.tokens -= 1
+                        bucket.used_today += 1
+                        return
+                    if now >= deadline:
+                        raise RateLimitExceeded(f"{host} 请求排队超过 {self.max_wait} 秒")
+                    # 队首等待下一个令牌，其他请求等待被唤醒
+                    wait = bucket.wait_time() if bucket.waiters[0] == ticket else None
+                    self._cond.wait(min(wait, deadline - now) if wait is not None else deadline - now)
+            finally:
+                bucket.waiters.remove(ticket)
+                heapq.heapify(bucket.waiters)
+                self._cond.notify_all()
+
+    def close(self):
+        """程序退出时唤醒所有排队的请求，之后的请求直接失败"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        """各主机的令牌、今日已用次数和排队数量"""
+        with self._cond:
+            now = time.monotonic()
+            result = {}
+            for host, bucket in self._buckets.items():
+                bucket.refill(now)
+                result[host] = {
+                    'tokens': bucket.tokens,
+                    'used_today': bucket.used_today,
+                    'daily_budget': bucket.daily_budget,
+                    'waiting': len(bucket.waiters)
+                }
+            return result
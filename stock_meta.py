@@ -0,0 +1,85 @@
+import threading
+from datetime import datetime, timedelta
+
+from models import Session, StockMeta
+
+
+class StockMetaCache:
+    """股票基本信息的持久缓存
+
+    启动时从数据库 stock_meta 表整体读入内存，查询不访问数据库和网络；
+    首次从行情源获取到股票信息时写入，超过 max_age 的记录由后台刷新。
+    指定 writer（BatchWriter）时写入交给写线程批量提交，否则每次写入使用独立的会话，
+    都可在后台线程中调用。
+    """
+
+    def __init__(self, session_factory=Session, max_age=timedelta(days=7), writer=None):
+        self.session_factory = session_factory
+        self.max_age = max_age
+        self.writer = writer
+        self._records = {}  # ts_code -> 字典
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        session = self.session_factory()
+        try:
+            records = {meta.ts_code: self._to_dict(meta) for meta in session.query(StockMeta).all()}
+        except Exception as e:
+            print(f"加载股票信息缓存失败: {e}")
+            return
+        finally:
+            session.close()
+        with self._lock:
+            self._records = records
+
+    @staticmethod
+    def _to_dict(meta):
+        return {
+            'ts_code': meta.ts_code,
+            'name': meta.name,
+            'industry': meta.industry or '',
+            'market': meta.market,
+            'price_precision': meta.price_precision if meta.price_precision is not None else 2,
+            'updated_at': meta.updated_at
+        }
+
+    def get(self, ts_code):
+        with self._lock:
+            return self._records.get(ts_code)
+
+    def put(self, info):
+        """保存 get_stock_info 返回的股票信息"""
+        ts_code = info['ts_code']
+        record = {
+            'ts_code': ts_code,
+            'name': info['name'],
+            'industry': info.get('industry') or '',
+            'market': ts_code.split('.')[1] if '.' in ts_code else None,
+            'price_precision': info.get('price_precision', 2),
+            'updated_at': datetime.now()
+        }
+        if self.writer:
+            try:
+                self.writer.submit(lambda session: session.merge(StockMeta(**record)))
+            except RuntimeError as e:
+                print(f"保存股票信息缓存失败: {e}")
+        else:
+            session = self.session_factory()
+            try:
+                session.merge(StockMeta(**record))
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                print(f"保存股票信息缓存失败: {e}")
+            finally:
+                session.close()
+        with self._lock:
+            self._records[ts_code] = record
+
+    def stale(self, now=None):
+        """需要刷新的股票代码"""
+        deadline = (now or datetime.now()) - self.max_age
+        with self._lock:
+            return [ts_code for ts_code, record in self._records.items()
+                    if record['updated_at'] is None or record['updated_at'] < deadline]
@@ -1,26 +1,119 @@
 import tushare as ts
 import pandas as pd
+import requests
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
-import requests
 import json
 import re
+import time
+import queue
+import threading
+from collections import namedtuple
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from http_pool import ProviderHttpPool
+from quote_cache import QuoteCache
+from provider_health import ProviderRegistry
+from kline_store import KlineStore
+from instrument_master import InstrumentMaster
+from stock_meta import StockMetaCache
+from db_writer import BatchWriter
+from quote_parser import parse_tencent, parse_sina
+from metrics import Metrics
+from rate_limiter import RateLimiter, bind_priority
+from eastmoney_stream import to_secid
 
 load_dotenv()
 
+# 证券代码表下载的板块: (东方财富板块筛选条件, 市场后缀)，市场为None时按返回的市场编号判断
+INSTRUMENT_SEGMENTS = [
+    ('m:1+t:2,m:1+t:23', 'SH'),               # 沪市主板、科创板
+    ('m:0+t:6,m:0+t:80', 'SZ'),               # 深市主板、创业板
+    ('m:0+t:81+s:2048', 'BJ'),                # 北交所
+    ('b:MK0021,b:MK0022,b:MK0023,b:MK0024', None),  # ETF
+]
+
+# 批量行情每次请求的最大股票数量
+QUOTE_BATCH_SIZE = 60
+
+# 北交所代码前缀（含新代码段920），东方财富市场编号与深市同为0
+BJ_PREFIXES = ('4', '8', '92')
+
 class StockService:
     def __init__(self):
         self.token = os.getenv('TUSHARE_TOKEN')
         # 禁用Tushare API，直接使用国内股价API
         self.use_tushare = False
         self.pro = None
+        # 按主机限制请求速率和每日请求次数，RATE_LIMIT_RATE 为0时不限制
+        rate = float(os.getenv('RATE_LIMIT_RATE', '5'))
+        self.rate_limiter = RateLimiter(
+            rate=rate,
+            burst=int(os.getenv('RATE_LIMIT_BURST', '10')),
+            daily_budget=int(os.getenv('RATE_LIMIT_DAILY_BUDGET', '0')),
+            max_wait=float(os.getenv('RATE_LIMIT_MAX_WAIT', '30')),
+            overrides=RateLimiter.parse_overrides(os.getenv('RATE_LIMIT_HOSTS'))
+        ) if rate > 0 else None
+        # 每个行情源一个长连接池，统一超时，可选失败重试
+        self.http = ProviderHttpPool(
+            pool_size=int(os.getenv('QUOTE_HTTP_POOL_SIZE', '10')),
+            timeout=(float(os.getenv('QUOTE_HTTP_CONNECT_TIMEOUT', '3')),
+                     float(os.getenv('QUOTE_HTTP_READ_TIMEOUT', '5'))),
+            retries=int(os.getenv('QUOTE_HTTP_RETRIES', '0')),
+            # 性能测试时指向本地回放服务器，见 benchmarks/replay_server.py
+            replay_url=os.getenv('QUOTE_REPLAY_URL'),
+            limiter=self.rate_limiter
+        )
+        # 实时价格获取模式: sequential 依次尝试, hedged 对冲请求, race 同时请求所有行情源
+        self.quote_mode = os.getenv('QUOTE_FETCH_MODE', 'hedged')
+        self.hedge_delay = float(os.getenv('QUOTE_HEDGE_DELAY', '0.3'))
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='quote')
+        # 实时行情缓存，交易时段内短期有效，休市期间有效到下次开盘
+        self.quote_cache = QuoteCache(
+            max_size=int(os.getenv('QUOTE_CACHE_SIZE', '2000')),
+            trading_ttl=float(os.getenv('QUOTE_CACHE_TTL', '5'))
+        )
+        # 本地日K线存储，只增量获取新数据
+        self.kline_store = KlineStore(os.getenv('KLINE_STORE_DIR', 'kline_data'))
+        # 本地证券代码表，用于离线搜索和确定市场
+        self.instrument_master = InstrumentMaster(os.getenv('INSTRUMENT_MASTER_PATH', 'instruments.json'))
+        # 后台线程的数据库写入合并成批提交
+        self.db_writer = BatchWriter()
+        # 股票名称、行业、价格精度的持久缓存，已知股票不再访问网络
+        self.stock_meta = StockMetaCache(writer=self.db_writer)
+        # 各行情源接口的健康统计，用于调整备用顺序和熔断
+        self.providers = ProviderRegistry(
+            failure_threshold=int(os.getenv('PROVIDER_FAILURE_THRESHOLD', '3')),
+            cooldown=float(os.getenv('PROVIDER_COOLDOWN', '30'))
+        )
+        # 按行情源、接口和结果统计请求次数和耗时
+        self.metrics = Metrics()
+        # 批量行情中最近的累计成交量（股），随价格一起记录到行情事件中
+        self.last_volumes = {}
+        self.metrics.add_gauge('quote_cache_hits_total', lambda: {(): self.quote_cache.hits}, 'counter')
+        self.metrics.add_gauge('quote_cache_misses_total', lambda: {(): self.quote_cache.misses}, 'counter')
+        self.metrics.add_gauge('provider_circuit_open', lambda: {
+            (('endpoint', item['endpoint']), ('provider', item['provider'])): int(item['state'] == 'open')
+            for item in self.providers.snapshot()
+        })
+        if self.rate_limiter:
+            self.metrics.add_gauge('rate_limit_used_today', lambda: {
+                (('host', host),): item['used_today'] for host, item in self.rate_limiter.stats().items()
+            })
+            self.metrics.add_gauge('rate_limit_waiting', lambda: {
+                (('host', host),): item['waiting'] for host, item in self.rate_limiter.stats().items()
+            })
         print("使用国内股价API: 东方财富、腾讯、新浪")
         
     def format_stock_code(self, stock_code):
         """格式化股票代码，添加市场后缀"""
         if '.' not in stock_code:
-            # 自动判断股票市场
+            # 优先使用证券代码表中的准确市场
+            ts_code = self.instrument_master.resolve(stock_code)
+            if ts_code:
+                return ts_code
+            # 代码表中没有时根据代码前缀判断股票市场
             if stock_code.startswith('6'):
                 return f"{stock_code}.SH"
             elif stock_code.startswith('0') or stock_code.startswith('3'):
@@ -35,118 +128,226 @@ class StockService:
                 return f"{stock_code}.SZ"  # 默认深市
         return stock_code
         
-    def get_stock_info(self, stock_code):
-        """获取股票基本信息"""
-        stock_code = self.format_stock_code(stock_code)
-        result = None
+    def refresh_instruments(self, force=False):
+        """从东方财富整体下载证券代码表，代码表未过期且不强制时直接返回"""
+        if not force and not self.instrument_master.is_stale():
+            return False
+        records = []
+        try:
+            for fs, suffix in INSTRUMENT_SEGMENTS:
+                page = 1
+                while True:
+                    url = f"https://push2.eastmoney.com/api/qt/clist/get?pn={page}&pz=5000&po=1&np=1&fltt=2&invt=2&fid=f12&fs={fs}&fields=f12,f13,f14,f100"
+                    response = self.http.get('eastmoney', url)
+                    response.raise_for_status()
+                    data = response.json().get('data') or {}
+                    items = data.get('diff') or []
+                    for item in items:
+                        market = suffix or ('SH' if item.get('f13') == 1 else 'SZ')
+                        industry = item.get('f100')
+                        records.append({
+                            'ts_code': f"{item['f12']}.{market}",
+                            'symbol': item['f12'],
+                            'name': item.get('f14', ''),
+                            'market': market,
+                            'industry': industry if isinstance(industry, str) and industry != '-' else ''
+                        })
+                    # 接口可能限制每页数量，按总数翻页
+                    if not items or page * len(items) >= data.get('total', 0):
+                        break
+                    page += 1
+        except Exception as e:
+            print(f"下载证券代码表失败: {e}")
+            return False
+        if records:
+            self.instrument_master.update(records)
+            print(f"证券代码表已更新，共{len(records)}条")
+        return bool(records)
         
+    def get_stock_info(self, stock_code, network=True):
+        """获取股票基本信息，优先使用本地缓存，network 为False时缓存中没有直接返回None"""
+        stock_code = self.format_stock_code(stock_code)
+        meta = self.stock_meta.get(stock_code)
+        if meta:
+            return {
+                'ts_code': stock_code,
+                'symbol': stock_code.split('.')[0],
+                'name': meta['name'],
+                'area': '',
+                'industry': meta['industry'],
+                'list_date': '',
+                'current_price': 0,
+                'price_precision': meta['price_precision']
+            }
+        return self._fetch_stock_info(stock_code) if network else None
+    
+    def refresh_stock_meta(self):
+        """批量重新获取过期的股票信息缓存，只请求名称、行业和价格精度，返回刷新的数量"""
+        stale = self.stock_meta.stale()
+        refreshed = 0
+        for start in range(0, len(stale), QUOTE_BATCH_SIZE):
+            chunk = stale[start:start + QUOTE_BATCH_SIZE]
+            infos = self._tracked('eastmoney', 'meta', self._fetch_meta_eastmoney, chunk) or {}
+            for info in infos.values():
+                self.stock_meta.put(info)
+                refreshed += 1
+        return refreshed
+    
+    def _fetch_meta_eastmoney(self, ts_codes):
+        """东方财富批量接口获取股票名称、行业和价格精度，返回 {ts_code: 股票信息}，请求失败返回None"""
+        result = {}
+        try:
+            secid_map = {to_secid(ts_code): ts_code for ts_code in ts_codes}
+            url = f"https://push2.eastmoney.com/api/qt/ulist.np/get?fltt=2&invt=2&fields=f1,f12,f13,f14,f100&secids={','.join(secid_map)}"
+            response = self.http.get('eastmoney', url)
+            
+            if response.status_code != 200:
+                return None
+            data = response.json().get('data') or {}
+            for item in data.get('diff') or []:
+                ts_code = secid_map.get(f"{item.get('f13')}.{item.get('f12')}")
+                name = item.get('f14')
+                # 没有数据的字段为 "-"
+                if not ts_code or not name or name == '-':
+                    continue
+                industry = item.get('f100')
+                precision = item.get('f1')
+                result[ts_code] = {
+                    'ts_code': ts_code,
+                    'name': name,
+                    'industry': industry if industry and industry != '-' else '',
+                    'price_precision': precision if isinstance(precision, int) else 2
+                }
+        except requests.RequestException as e:
+            print(f"东方财富API批量获取股票信息失败: {e}")
+            return None
+        except Exception as e:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析东方财富股票信息失败: {e}")
+            return {}
+        return result
+    
+    def _fetch_stock_info(self, stock_code):
+        """从行情源获取股票基本信息并写入缓存"""
         # 尝试使用Tushare
         if self.use_tushare:
             try:
                 df = self.pro.daily_basic(ts_code=stock_code, 
                                         fields='ts_code,symbol,name,area,industry,list_date')
                 if not df.empty:
-                    result = df.iloc[0].to_dict()
+                    return df.iloc[0].to_dict()
             except Exception as e:
                 print(f"Tushare获取股票信息失败: {e}")
         
-        # 尝试使用东方财富接口
-        if result is None:
-            try:
-                simple_code = stock_code.split('.')[0]
-                url = f"https://searchapi.eastmoney.com/api/suggest/get?input={simple_code}&type=14&token=D43BF722C8E33BDC906FB84D85E326E8"
-                response = requests.get(url)
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get('QuotationCodeTable', {}).get('Data'):
-                        for item in data['QuotationCodeTable']['Data']:
-                            if item.get('Code') == simple_code:
-                                # 尝试获取实时价格
-                                current_price, price_precision = self.get_realtime_price(stock_code)
-                                return {
-                                    'ts_code': stock_code,
-                                    'symbol': simple_code,
-                                    'name': item.get('Name', ''),
-                                    'area': '',
-                                    'industry': item.get('QuotationCodeTableMarket', {}).get('Name', ''),
-                                    'list_date': '',
-                                    'current_price': current_price or 0,
-                                    'price_precision': price_precision
-                                }
-            except Exception as e:
-                print(f"东方财富接口失败: {e}")
-        
-        # 尝试使用新浪API
-        if result is None:
-            try:
-                code_prefix = 'sh' if stock_code.endswith('.SH') else 'sz'
-                simple_code = stock_code.split('.')[0]
-                query_code = f"{code_prefix}{simple_code}"
-                    
-                url = f"http://hq.sinajs.cn/list={query_code}"
-                headers = {"Referer": "https://finance.sina.com.cn"}
-                response = requests.get(url, headers=headers)
-                
-                if response.status_code == 200:
-                    content = response.text
-                    # 解析返回数据
-                    matches = re.findall(r'hq_str_(?:\w+)=\"([^\"]+)\"', content)
-                    if matches and len(matches[0].split(',')) > 1:
-                        data = matches[0].split(',')
-                        price_str = data[3] if len(data) > 3 else "0"
-                        price = float(price_str) if price_str else 0
-                        # 确定价格精度
-                        price_precision = len(price_str.split('.')[1]) if '.' in price_str else 0
-                        
-                        return {
-                            'ts_code': stock_code,
-                            'symbol': simple_code,
-                            'name': data[0],
-                            'area': '',
-                            'industry': '',
-                            'list_date': '',
-                            'current_price': price,
-                            'price_precision': price_precision
-                        }
-            except Exception as e:
-                print(f"新浪API获取股票信息失败: {e}")
-        
-        # 尝试使用腾讯API
-        if result is None:
-            try:
-                simple_code = stock_code.split('.')[0]
-                market = 'sh' if stock_code.endswith('.SH') else 'sz'
-                query_code = f"{market}{simple_code}"
-                
-                url = f"https://qt.gtimg.cn/q={query_code}"
-                response = requests.get(url)
-                
-                if response.status_code == 200:
-                    content = response.text
-                    # 解析返回数据
-                    pattern = r'v_.*="(.*)"'
-                    matches = re.findall(pattern, content)
-                    if matches and len(matches[0].split('~')) > 1:
-                        data = matches[0].split('~')
-                        price_str = data[3] if len(data) > 3 else "0"
-                        price = float(price_str) if price_str else 0
-                        # 确定价格精度
-                        price_precision = len(price_str.split('.')[1]) if '.' in price_str else 0
-                        
-                        return {
-                            'ts_code': stock_code,
-                            'symbol': simple_code,
-                            'name': data[1],
-                            'area': '',
-                            'industry': '',
-                            'list_date': '',
-                            'current_price': price,
-                            'price_precision': price_precision
-                        }
-            except Exception as e:
-                print(f"腾讯API获取股票信息失败: {e}")
-                
-        return result
+        # 默认顺序: 东方财富、新浪、腾讯，按健康度调整
+        fetchers = {
+            'eastmoney': self._fetch_info_eastmoney,
+            'sina': self._fetch_info_sina,
+            'tencent': self._fetch_info_tencent,
+        }
+        for attempt, provider in enumerate(self.providers.order('info', list(fetchers))):
+            if attempt:
+                self.metrics.inc('provider_fallbacks_total', endpoint='info')
+            result = self._tracked(provider, 'info', fetchers[provider], stock_code)
+            if result:
+                if result.get('name'):
+                    self.stock_meta.put(result)
+                return result
+        return None
+    
+    def _fetch_info_eastmoney(self, stock_code):
+        """东方财富接口获取股票信息，请求失败返回None，没有找到返回空字典"""
+        try:
+            simple_code = stock_code.split('.')[0]
+            url = f"https://searchapi.eastmoney.com/api/suggest/get?input={simple_code}&type=14&token=D43BF722C8E33BDC906FB84D85E326E8"
+            response = self.http.get('eastmoney', url)
+            if response.status_code != 200:
+                return None
+            data = response.json()
+            for item in data.get('QuotationCodeTable', {}).get('Data') or []:
+                if item.get('Code') == simple_code:
+                    # 尝试获取实时价格
+                    current_price, price_precision = self.get_realtime_price(stock_code)
+                    return {
+                        'ts_code': stock_code,
+                        'symbol': simple_code,
+                        'name': item.get('Name', ''),
+                        'area': '',
+                        'industry': item.get('QuotationCodeTableMarket', {}).get('Name', ''),
+                        'list_date': '',
+                        'current_price': current_price or 0,
+                        'price_precision': price_precision
+                    }
+        except requests.RequestException as e:
+            print(f"东方财富接口失败: {e}")
+            return None
+        except Exception as e:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析东方财富股票信息失败: {e}")
+            return {}
+        return {}
+    
+    def _fetch_info_sina(self, stock_code):
+        """新浪API获取股票信息，请求失败返回None，没有找到返回空字典"""
+        try:
+            url = f"http://hq.sinajs.cn/list={self._query_code(stock_code)}"
+            response = self.http.get('sina', url)
+            
+            if response.status_code != 200:
+                return None
+            # 解析返回数据，代码不存在时没有行情行或名称为空
+            quotes = parse_sina(response.content, with_name=True)
+            if quotes and quotes[0].name:
+                quote = quotes[0]
+                return {
+                    'ts_code': stock_code,
+                    'symbol': stock_code.split('.')[0],
+                    'name': quote.name,
+                    'area': '',
+                    'industry': '',
+                    'list_date': '',
+                    'current_price': quote.price,
+                    'price_precision': quote.precision
+                }
+        except requests.RequestException as e:
+            print(f"新浪API获取股票信息失败: {e}")
+            return None
+        except Exception as e:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析新浪股票信息失败: {e}")
+            return {}
+        return {}
+    
+    def _fetch_info_tencent(self, stock_code):
+        """腾讯API获取股票信息，请求失败返回None，没有找到返回空字典"""
+        try:
+            url = f"https://qt.gtimg.cn/q={self._query_code(stock_code)}"
+            response = self.http.get('tencent', url)
+            
+            if response.status_code != 200:
+                return None
+            # 解析返回数据，代码不存在时没有行情行或名称为空
+            quotes = parse_tencent(response.content, with_name=True)
+            if quotes and quotes[0].name:
+                quote = quotes[0]
+                return {
+                    'ts_code': stock_code,
+                    'symbol': stock_code.split('.')[0],
+                    'name': quote.name,
+                    'area': '',
+                    'industry': '',
+                    'list_date': '',
+                    'current_price': quote.price,
+                    'price_precision': quote.precision
+                }
+        except requests.RequestException as e:
+            print(f"腾讯API获取股票信息失败: {e}")
+            return None
+        except Exception as e:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析腾讯股票信息失败: {e}")
+            return {}
+        return {}
             
     def get_realtime_price(self, stock_code):
         """获取实时股价，返回价格和价格精度"""
@@ -159,108 +360,306 @@ class StockService:
         except Exception as e:
             print(f"格式化股票代码出错: {e}")
         
-        price = None
-        price_precision = 2  # 默认精度为2位小数
+        quote = self.quote_cache.get(stock_code)
+        if quote:
+            return quote
         
-        # 尝试使用腾讯股票API（更适合实时行情）
+        # 默认腾讯（更适合实时行情），其次新浪，最后东方财富，按健康度调整
+        provider_fetchers = {
+            'tencent': self._fetch_price_tencent,
+            'sina': self._fetch_price_sina,
+            'eastmoney': self._fetch_price_eastmoney,
+        }
+        fetchers = [partial(self._tracked, provider, 'quote', provider_fetchers[provider])
+                    for provider in self.providers.order('quote', list(provider_fetchers))]
+        quote = None
+        if self.quote_mode == 'sequential':
+            for attempt, fetch in enumerate(fetchers):
+                if attempt:
+                    self.metrics.inc('provider_fallbacks_total', endpoint='quote')
+                quote = fetch(stock_code)
+                if quote:
+                    break
+        else:
+            # race模式同时请求所有行情源，hedged模式在主行情源超过对冲延迟未返回时再请求备用源
+            hedge_delay = 0 if self.quote_mode == 'race' else self.hedge_delay
+            if fetchers:
+                quote = self._race_price(stock_code, fetchers, hedge_delay)
+            
+        if quote:
+            self.quote_cache.put(stock_code, quote)
+            return quote
+        return None, 2
+    
+    def _tracked(self, provider, endpoint, fetch, *args):
+        """调用行情源并记录结果到健康统计和监控指标
+
+        行情源接口在网络异常（连接、超时、限流）或HTTP状态错误时返回None，记为失败；请求成功但
+        代码不存在、没有数据或解析响应出错时返回空结果（空元组、空字典、空列表、空DataFrame），
+        不计入熔断。
+        """
+        start = time.monotonic()
+        result = None
         try:
-            market = 'sh' if stock_code.endswith('.SH') else 'sz'
-            simple_code = stock_code.split('.')[0]
-            query_code = f"{market}{simple_code}"
+            result = fetch(*args)
+        finally:
+            elapsed = time.monotonic() - start
+            ok = result is not None
+            self.providers.record(provider, endpoint, ok, elapsed)
+            # 结果: success 成功, empty 请求成功但没有数据, failure 失败
+            outcome = 'failure' if not ok else ('empty' if hasattr(result, '__len__') and len(result) == 0 else 'success')
+            self.metrics.inc('provider_requests_total', provider=provider, endpoint=endpoint, outcome=outcome)
+            self.metrics.observe('provider_request_duration_seconds', elapsed, provider=provider, endpoint=endpoint)
+        return result
+    
+    def close(self):
+        """取消尚未开始的请求，关闭限速队列和连接池，不等待进行中的请求"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.rate_limiter:
+            self.rate_limiter.close()
+        self.http.close()
+    
+    def cache_stats(self):
+        """实时行情缓存的命中统计"""
+        return self.quote_cache.stats()
+    
+    def _race_price(self, stock_code, fetchers, hedge_delay):
+        """并发请求多个行情源，返回第一个有效价格
+        
+        立即请求第一个行情源，之后每经过 hedge_delay 秒或有请求失败时再启动下一个备用源。
+        拿到有效价格后取消尚未开始的请求，已经发出的请求在后台结束后丢弃结果。
+        """
+        # 线程池中的请求沿用调用线程的优先级
+        pending = [bind_priority(fetch) for fetch in fetchers]
+        running = {self._executor.submit(pending.pop(0), stock_code)}
+        while running:
+            done, running = wait(running, timeout=hedge_delay if pending else None,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                quote = future.result()
+                if quote:
+                    for other in running:
+                        other.cancel()
+                    return quote
+            # 超过对冲延迟或已有行情源失败，启动下一个备用源
+            if pending:
+                self.metrics.inc('provider_fallbacks_total', endpoint='quote')
+                running.add(self._executor.submit(pending.pop(0), stock_code))
+        return None
+    
+    def _fetch_price_tencent(self, stock_code):
+        """腾讯股票API获取实时价格，请求失败返回None，代码不存在或没有价格返回空元组"""
+        try:
+            url = f"https://qt.gtimg.cn/q={self._query_code(stock_code)}"
+            response = self.http.get('tencent', url)
             
-            url = f"https://qt.gtimg.cn/q={query_code}"
-            response = requests.get(url, timeout=5)  # 添加超时
+            if response.status_code != 200:
+                return None
+            quotes = parse_tencent(response.content)
+            if quotes and quotes[0].price > 0:
+                return quotes[0].price, quotes[0].precision
+        except requests.RequestException as e:
+            print(f"腾讯API获取实时价格失败: {e}")
+            return None
+        except Exception as e:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析腾讯实时价格失败: {e}")
+            return ()
+        return ()
+    
+    def _fetch_price_sina(self, stock_code):
+        """新浪财经API获取实时价格，请求失败返回None，代码不存在或没有价格返回空元组"""
+        try:
+            url = f"http://hq.sinajs.cn/list={self._query_code(stock_code)}"
+            response = self.http.get('sina', url)
             
-            if response.status_code == 200:
-                content = response.text
-                pattern = r'v_.*="(.*)"'
-                matches = re.findall(pattern, content)
-                if matches and len(matches[0].split('~')) > 3:
-                    data = matches[0].split('~')
-                    try:
-                        price_str = data[3]
-                        price = float(price_str)
-                        
-                        # 确定价格精度
-                        if '.' in price_str:
-                            price_precision = len(price_str.split('.')[1])
-                        else:
-                            price_precision = 0
-                            
-                        if price > 0:
-                            return price, price_precision
-                    except (ValueError, IndexError) as e:
-                        print(f"腾讯API返回的价格解析失败: {e}")
+            if response.status_code != 200:
+                return None
+            quotes = parse_sina(response.content)
+            if quotes and quotes[0].price > 0:
+                return quotes[0].price, quotes[0].precision
+        except requests.RequestException as e:
+            print(f"新浪API获取实时价格失败: {e}")
+            return None
         except Exception as e:
-            print(f"腾讯API获取实时价格失败: {e}")
-                
-        # 如果腾讯API失败，尝试使用新浪财经API
-        if price is None:
-            try:
-                code_prefix = 'sh' if stock_code.endswith('.SH') else 'sz'
-                simple_code = stock_code.split('.')[0]
-                query_code = f"{code_prefix}{simple_code}"
-                    
-                url = f"http://hq.sinajs.cn/list={query_code}"
-                headers = {"Referer": "https://finance.sina.com.cn"}
-                response = requests.get(url, headers=headers, timeout=5)
-                
-                if response.status_code == 200:
-                    content = response.text
-                    # 解析返回数据
-                    matches = re.findall(r'hq_str_(?:\w+)=\"([^\"]+)\"', content)
-                    if matches and len(matches[0].split(',')) > 3:
-                        data = matches[0].split(',')
-                        try:
-                            price_str = data[3]
-                            price = float(price_str)
-                            
-                            # 确定价格精度
-                            if '.' in price_str:
-                                price_precision = len(price_str.split('.')[1])
-                            else:
-                                price_precision = 0
-                                
-                            if price > 0:
-                                return price, price_precision
-                        except (ValueError, IndexError) as e:
-                            print(f"新浪API返回的价格解析失败: {e}")
-            except Exception as e:
-                print(f"新浪API获取实时价格失败: {e}")
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析新浪实时价格失败: {e}")
+            return ()
+        return ()
+    
+    def _fetch_price_eastmoney(self, stock_code):
+        """东方财富数据接口获取实时价格，请求失败返回None，代码不存在或停牌没有价格返回空元组"""
+        try:
+            url = f"https://push2.eastmoney.com/api/qt/stock/get?ut=fa5fd1943c7b386f172d6893dbfba10b&invt=2&fltt=2&fields=f43,f57,f58,f59,f169,f170,f46,f44,f51,f168,f47,f164,f163,f116,f60,f45,f52,f50,f48,f167,f117,f71,f161,f49,f530,f135,f136,f137,f138,f139,f141,f142,f144,f145,f147,f148,f140,f143,f146,f149,f55,f62,f162,f92,f173,f104,f105,f84,f85,f183,f184,f185,f186,f187,f188,f189,f190,f191,f192,f107,f111,f86,f177,f78,f110,f262,f263,f264,f267,f268,f250,f251,f252,f253,f254,f255,f256,f257,f258,f266,f269,f270,f271,f273,f274,f275,f127,f199,f128,f193,f196,f194,f195,f197,f80,f280,f281,f282,f284,f285,f286,f287,f292&secid={to_secid(stock_code)}&cb=jQuery183020305881136688065_1638156597200&_=1638156597200"
+            response = self.http.get('eastmoney', url)
             
-        # 尝试东方财富数据接口
-        if price is None:
+            if response.status_code != 200:
+                return None
+            # 从jQuery回调中提取JSON数据
+            json_data = re.findall(r'jQuery[0-9_]+\((.*)\)', response.text)
+            if not json_data:
+                return None
+            data = json.loads(json_data[0])
+            quote = data.get('data') or {}
+            # fltt=2 时 f43 最新价已是小数，f59 为价格小数位数；停牌时价格为 "-"
+            price_val = quote.get('f43')
+            if isinstance(price_val, (int, float)) and price_val > 0:
+                precision = quote.get('f59')
+                if not isinstance(precision, int):
+                    precision = max(2, self._price_precision(str(round(price_val, 3))))
+                return price_val, precision
+        except requests.RequestException as e:
+            print(f"东方财富API获取实时价格失败: {e}")
+            return None
+        except Exception as e:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析东方财富实时价格失败: {e}")
+            return ()
+        return ()
+        
+    def get_realtime_quotes(self, stock_codes):
+        """批量获取实时股价，返回 {股票代码: (价格, 价格精度)}
+
+        腾讯和新浪接口都支持逗号分隔的多只股票，按 QUOTE_BATCH_SIZE 分批请求，
+        腾讯失败的代码再交给新浪，最后剩下的交给东方财富批量接口。
+        """
+        quotes = {}
+        # 去重并保持顺序，记录格式化代码到原始代码的映射
+        pending = {}
+        for code in stock_codes:
+            if not code:
+                continue
             try:
-                simple_code = stock_code.split('.')[0]
-                market = 0 if stock_code.endswith('.SZ') else 1  # 深市=0，沪市=1
-                url = f"https://push2.eastmoney.com/api/qt/stock/get?ut=fa5fd1943c7b386f172d6893dbfba10b&invt=2&fltt=2&fields=f43,f57,f58,f169,f170,f46,f44,f51,f168,f47,f164,f163,f116,f60,f45,f52,f50,f48,f167,f117,f71,f161,f49,f530,f135,f136,f137,f138,f139,f141,f142,f144,f145,f147,f148,f140,f143,f146,f149,f55,f62,f162,f92,f173,f104,f105,f84,f85,f183,f184,f185,f186,f187,f188,f189,f190,f191,f192,f107,f111,f86,f177,f78,f110,f262,f263,f264,f267,f268,f250,f251,f252,f253,f254,f255,f256,f257,f258,f266,f269,f270,f271,f273,f274,f275,f127,f199,f128,f193,f196,f194,f195,f197,f80,f280,f281,f282,f284,f285,f286,f287,f292&secid={market}.{simple_code}&cb=jQuery183020305881136688065_1638156597200&_=1638156597200"
-                response = requests.get(url, timeout=5)
-                
-                if response.status_code == 200:
-                    content = response.text
-                    # 从jQuery回调中提取JSON数据
-                    json_data = re.findall(r'jQuery[0-9_]+\((.*)\)', content)
-                    if json_data:
-                        try:
-                            data = json.loads(json_data[0])
-                            if 'data' in data and 'f43' in data['data']:
-                                # f43是最新价
-                                price_val = data['data']['f43'] / 100  # 价格可能需要除以100
-                                price_str = str(price_val)
-                                
-                                # 确定价格精度
-                                price_precision = len(price_str.split('.')[1]) if '.' in price_str else 0
-                                return price_val, price_precision
-                        except (ValueError, KeyError, IndexError) as e:
-                            print(f"东方财富数据解析失败: {e}")
+                codes = pending.setdefault(self.format_stock_code(code), [])
+                if code not in codes:
+                    codes.append(code)
             except Exception as e:
-                print(f"东方财富API获取实时价格失败: {e}")
-                
-        return None, price_precision
+                print(f"格式化股票代码出错: {e}")
+        
+        # 先从缓存中取，只请求未命中的代码
+        for ts_code in list(pending):
+            quote = self.quote_cache.get(ts_code)
+            if quote:
+                for code in pending.pop(ts_code):
+                    quotes[code] = quote
+        
+        provider_fetchers = {
+            'tencent': self._fetch_quotes_tencent,
+            'sina': self._fetch_quotes_sina,
+            'eastmoney': self._fetch_quotes_eastmoney,
+        }
+        for attempt, provider in enumerate(self.providers.order('quotes', list(provider_fetchers))):
+            if not pending:
+                break
+            if attempt:
+                self.metrics.inc('provider_fallbacks_total', endpoint='quotes')
+            ts_codes = list(pending)
+            for start in range(0, len(ts_codes), QUOTE_BATCH_SIZE):
+                chunk = ts_codes[start:start + QUOTE_BATCH_SIZE]
+                batch = self._tracked(provider, 'quotes', provider_fetchers[provider], chunk) or {}
+                for ts_code, quote in batch.items():
+                    self.quote_cache.put(ts_code, quote)
+                    for code in pending.pop(ts_code, []):
+                        quotes[code] = quote
+        
+        for codes in pending.values():
+            for code in codes:
+                quotes[code] = (None, 2)
+        return quotes
+    
+    def _fetch_quotes_tencent(self, ts_codes):
+        """腾讯批量行情接口，返回 {ts_code: (价格, 价格精度)}，请求失败返回None"""
+        result = {}
+        try:
+            query_map = {self._query_code(ts_code): ts_code for ts_code in ts_codes}
+            url = f"https://qt.gtimg.cn/q={','.join(query_map)}"
+            response = self.http.get('tencent', url)
+            
+            if response.status_code != 200:
+                return None
+            for quote in parse_tencent(response.content):
+                if quote.code in query_map and quote.price > 0:
+                    result[query_map[quote.code]] = (quote.price, quote.precision)
+                    self.last_volumes[query_map[quote.code]] = quote.volume
+        except requests.RequestException as e:
+            print(f"腾讯API批量获取实时价格失败: {e}")
+            return None
+        except Exception as e:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析腾讯批量行情失败: {e}")
+            return {}
+        return result
+    
+    def _fetch_quotes_sina(self, ts_codes):
+        """新浪批量行情接口，返回 {ts_code: (价格, 价格精度)}，请求失败返回None"""
+        result = {}
+        try:
+            query_map = {self._query_code(ts_code): ts_code for ts_code in ts_codes}
+            url = f"http://hq.sinajs.cn/list={','.join(query_map)}"
+            response = self.http.get('sina', url)
+            
+            if response.status_code != 200:
+                return None
+            for quote in parse_sina(response.content):
+                if quote.code in query_map and quote.price > 0:
+                    result[query_map[quote.code]] = (quote.price, quote.precision)
+                    self.last_volumes[query_map[quote.code]] = quote.volume
+        except requests.RequestException as e:
+            print(f"新浪API批量获取实时价格失败: {e}")
+            return None
+        except Exception as e:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析新浪批量行情失败: {e}")
+            return {}
+        return result
+    
+    def _fetch_quotes_eastmoney(self, ts_codes):
+        """东方财富批量行情接口，返回 {ts_code: (价格, 价格精度)}，请求失败返回None"""
+        result = {}
+        try:
+            secid_map = {}
+            for ts_code in ts_codes:
+                secid_map[to_secid(ts_code)] = ts_code
+            url = f"https://push2.eastmoney.com/api/qt/ulist.np/get?fltt=2&invt=2&fields=f1,f2,f5,f12,f13&secids={','.join(secid_map)}"
+            response = self.http.get('eastmoney', url)
+            
+            if response.status_code != 200:
+                return None
+            data = response.json().get('data') or {}
+            for item in data.get('diff') or []:
+                ts_code = secid_map.get(f"{item.get('f13')}.{item.get('f12')}")
+                price = item.get('f2')
+                # 停牌时价格字段为 "-"；f1 为价格小数位数，小数价格转字符串会丢掉末尾的0
+                if ts_code and isinstance(price, (int, float)) and price > 0:
+                    precision = item.get('f1')
+                    if not isinstance(precision, int):
+                        precision = max(2, self._price_precision(str(round(price, 3))))
+                    result[ts_code] = (price, precision)
+                    # 成交量单位为手
+                    if isinstance(item.get('f5'), (int, float)):
+                        self.last_volumes[ts_code] = item['f5'] * 100
+        except requests.RequestException as e:
+            print(f"东方财富API批量获取实时价格失败: {e}")
+            return None
+        except Exception as e:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析东方财富批量行情失败: {e}")
+            return {}
+        return result
+    
+    def _query_code(self, ts_code):
+        """转换为腾讯/新浪接口使用的代码，如 600000.SH -> sh600000"""
+        market = ts_code.split('.')[1].lower() if '.' in ts_code else 'sz'
+        return f"{market}{ts_code.split('.')[0]}"
+    
+    def _price_precision(self, price_str):
+        """根据价格字符串确定价格精度"""
+        return len(price_str.split('.')[1]) if '.' in price_str else 0
         
-    def check_price_targets(self, trade):
-        """检查股票价格是否达到目标"""
-        current_price, _ = self.get_realtime_price(trade.stock_code)
+    def check_price_targets(self, trade, current_price=None):
+        """检查股票价格是否达到目标，可传入已批量获取的价格"""
+        if current_price is None:
+            current_price, _ = self.get_realtime_price(trade.stock_code)
         if current_price:
             if current_price >= trade.sell_target:
                 return "卖出"
@@ -268,8 +667,11 @@ class StockService:
                 return "买入"
         return None
 
-    def get_historical_data(self, stock_code, days=30):
-        """获取历史数据"""
+    def get_historical_data(self, stock_code, days=30, adjust='none'):
+        """获取历史数据，adjust 为复权类型: none 不复权, qfq 前复权, hfq 后复权
+        
+        K线保存在本地，只从网络获取本地最后一根K线之后的数据，网络不可用时返回本地数据。
+        """
         stock_code = self.format_stock_code(stock_code)
         
         # 尝试使用Tushare
@@ -289,180 +691,424 @@ class StockService:
             except Exception as e:
                 print(f"Tushare获取历史数据失败: {e}")
         
-        # 尝试东方财富接口
+        store = self.kline_store
+        # 只取出数量和最后收盘价，不持有文件映射，之后 write 才能替换文件（Windows）
+        stored_count, stored_close = store.summary(stock_code, adjust)
+        enough = stored_count >= days or store.is_complete(stock_code, adjust)
+        if enough and store.is_fresh(stock_code, adjust):
+            return store.to_frame(store.read(stock_code, adjust, count=days))
+        
+        # 本地数据足够时只增量获取最后一根K线之后的数据（包含最后一根用于校验），否则获取整个窗口
+        since = store.last_date(stock_code, adjust) if enough else None
+        bars = self._fetch_kline(stock_code, days, adjust, since)
+        if bars is not None and since and adjust != 'none':
+            # 复权价格会在除权后整体变化，重叠的K线对不上时重新获取全部历史
+            overlap = bars[bars['date'] == since]
+            if len(overlap) and abs(overlap['close'][0] - stored_close) > 1e-6:
+                print(f"{stock_code}复权数据已变化，重新获取历史K线")
+                since = None
+                days = max(days, stored_count)
+                bars = self._fetch_kline(stock_code, days, adjust, None)
+                if bars is not None:
+                    store.write(stock_code, adjust, bars, merge=False, complete=len(bars) < days)
+                    return store.to_frame(store.read(stock_code, adjust, count=days))
+        if bars is not None:
+            store.write(stock_code, adjust, bars, complete=since is None and len(bars) < days)
+        
+        cached = store.read(stock_code, adjust, count=days)
+        return store.to_frame(cached) if len(cached) else None
+    
+    def _fetch_kline(self, stock_code, days, adjust, since):
+        """按健康度依次从各行情源获取日K线，返回K线数组，全部失败返回None"""
+        # 默认顺序: 东方财富、新浪、腾讯，按健康度调整；新浪接口只有不复权数据
+        fetchers = {
+            'eastmoney': self._fetch_kline_eastmoney,
+            'sina': self._fetch_kline_sina,
+            'tencent': self._fetch_kline_tencent,
+        }
+        if adjust != 'none':
+            del fetchers['sina']
+        for attempt, provider in enumerate(self.providers.order('kline', list(fetchers))):
+            if attempt:
+                self.metrics.inc('provider_fallbacks_total', endpoint='kline')
+            df = self._tracked(provider, 'kline', fetchers[provider], stock_code, days, adjust, since)
+            if df is not None and not df.empty:
+                bars = self.kline_store.from_frame(df)
+                return bars[bars['date'] >= since] if since else bars[-days:]
+        return None
+    
+    def _kline_count(self, days, since):
+        """需要请求的K线数量，增量获取时按自然日估算上限"""
+        if since is None:
+            return days
+        return (datetime.now() - datetime.strptime(str(since), '%Y%m%d')).days + 1
+    
+    def _fetch_kline_eastmoney(self, stock_code, days, adjust, since):
+        """东方财富接口获取日K线，请求失败返回None，没有数据返回空DataFrame"""
         try:
-            simple_code = stock_code.split('.')[0]
-            market = 0 if stock_code.endswith('.SZ') else 1
-            url = f"https://push2his.eastmoney.com/api/qt/stock/kline/get?fields1=f1,f2,f3,f4,f5,f6&fields2=f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61&klt=101&fqt=0&secid={market}.{simple_code}&beg=0&end=20500000&lmt={days}"
-            response = requests.get(url)
+            fqt = {'none': 0, 'qfq': 1, 'hfq': 2}[adjust]
+            beg = since or 0
+            url = f"https://push2his.eastmoney.com/api/qt/stock/kline/get?fields1=f1,f2,f3,f4,f5,f6&fields2=f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61&klt=101&fqt={fqt}&secid={to_secid(stock_code)}&beg={beg}&end=20500000&lmt={self._kline_count(days, since)}"
+            response = self.http.get('eastmoney', url)
             
-            if response.status_code == 200:
-                data = response.json()
-                if data['data'] and data['data']['klines']:
-                    klines = data['data']['klines']
-                    result = []
-                    for line in klines:
-                        parts = line.split(',')
-                        result.append({
-                            'trade_date': parts[0],
-                            'open': float(parts[1]),
-                            'close': float(parts[2]),
-                            'high': float(parts[3]),
-                            'low': float(parts[4]),
-                            'vol': float(parts[5])
-                        })
-                    return pd.DataFrame(result)
-        except Exception as e:
+            if response.status_code != 200:
+                return None
+            data = response.json()
+            klines = (data.get('data') or {}).get('klines') or []
+            result = []
+            for line in klines:
+                parts = line.split(',')
+                result.append({
+                    'trade_date': parts[0],
+                    'open': float(parts[1]),
+                    'close': float(parts[2]),
+                    'high': float(parts[3]),
+                    'low': float(parts[4]),
+                    'vol': float(parts[5])
+                })
+            return pd.DataFrame(result)
+        except requests.RequestException as e:
             print(f"东方财富获取历史数据失败: {e}")
-        
-        # 新浪API: 日线数据
+            return None
+        except Exception as e:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析东方财富K线失败: {e}")
+            return pd.DataFrame()
+    
+    def _fetch_kline_sina(self, stock_code, days, adjust, since):
+        """新浪API获取日K线，请求失败返回None，没有数据返回空DataFrame"""
         try:
             market = 'sh' if stock_code.endswith('.SH') else 'sz'
             simple_code = stock_code.split('.')[0]
             
-            url = f"https://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData?symbol={market}{simple_code}&scale=240&ma=no&datalen={days}"
-            response = requests.get(url)
+            url = f"https://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData?symbol={market}{simple_code}&scale=240&ma=no&datalen={self._kline_count(days, since)}"
+            response = self.http.get('sina', url)
             
-            if response.status_code == 200 and response.text:
-                data = json.loads(response.text)
-                df = pd.DataFrame(data)
-                if not df.empty:
-                    df.rename(columns={
-                        'day': 'trade_date',
-                        'open': 'open',
-                        'high': 'high',
-                        'low': 'low',
-                        'close': 'close',
-                        'volume': 'vol'
-                    }, inplace=True)
-                    # 确保数值类型
-                    for col in ['open', 'high', 'low', 'close']:
-                        df[col] = pd.to_numeric(df[col])
-                    df['vol'] = pd.to_numeric(df['vol'])
-                    return df
-        except Exception as e:
+            if response.status_code != 200:
+                return None
+            # 代码不存在时返回空内容或 null
+            data = json.loads(response.text) if response.text.strip() else None
+            df = pd.DataFrame(data or [])
+            if not df.empty:
+                df.rename(columns={
+                    'day': 'trade_date',
+                    'open': 'open',
+                    'high': 'high',
+                    'low': 'low',
+                    'close': 'close',
+                    'volume': 'vol'
+                }, inplace=True)
+                # 确保数值类型
+                for col in ['open', 'high', 'low', 'close']:
+                    df[col] = pd.to_numeric(df[col])
+                df['vol'] = pd.to_numeric(df['vol'])
+            return df
+        except requests.RequestException as e:
             print(f"新浪API获取历史数据失败: {e}")
-        
-        # 腾讯API: 获取历史日K
+            return None
+        except Exception as e:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析新浪K线失败: {e}")
+            return pd.DataFrame()
+    
+    def _fetch_kline_tencent(self, stock_code, days, adjust, since):
+        """腾讯API获取日K线，请求失败返回None，没有数据返回空DataFrame"""
         try:
             market = 'sh' if stock_code.endswith('.SH') else 'sz'
             simple_code = stock_code.split('.')[0]
             
             today = datetime.now().strftime('%Y-%m-%d')
-            start_day = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+            if since:
+                start_day = datetime.strptime(str(since), '%Y%m%d').strftime('%Y-%m-%d')
+            else:
+                # 按自然日留足余量，再由数量参数限制为最近的 days 根
+                start_day = (datetime.now() - timedelta(days=days * 2 + 10)).strftime('%Y-%m-%d')
+            fq = '' if adjust == 'none' else adjust
             
-            url = f"https://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={market}{simple_code},day,{start_day},{today},60,qfq"
-            response = requests.get(url)
+            url = f"https://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={market}{simple_code},day,{start_day},{today},{self._kline_count(days, since)},{fq}"
+            response = self.http.get('tencent', url)
             
-            if response.status_code == 200:
-                data = response.json()
-                if data['code'] == 0 and data['data']:
-                    kline_key = 'qfqday' if 'qfqday' in data['data'][f"{market}{simple_code}"] else 'day'
-                    klines = data['data'][f"{market}{simple_code}"][kline_key]
-                    result = []
-                    for k in klines:
-                        result.append({
-                            'trade_date': k[0],
-                            'open': float(k[1]),
-                            'close': float(k[2]),
-                            'high': float(k[3]),
-                            'low': float(k[4]),
-                            'vol': float(k[5])
-                        })
-                    return pd.DataFrame(result)
-        except Exception as e:
+            if response.status_code != 200:
+                return None
+            data = response.json()
+            if data.get('code') != 0:
+                return None
+            # 代码不存在时 data 为空或没有该股票的K线
+            stock_data = (data.get('data') or {}).get(f"{market}{simple_code}") or {}
+            klines = stock_data.get(f'{fq}day') or stock_data.get('day') or []
+            result = []
+            for k in klines:
+                result.append({
+                    'trade_date': k[0],
+                    'open': float(k[1]),
+                    'close': float(k[2]),
+                    'high': float(k[3]),
+                    'low': float(k[4]),
+                    'vol': float(k[5])
+                })
+            return pd.DataFrame(result)
+        except requests.RequestException as e:
             print(f"腾讯API获取历史数据失败: {e}")
+            return None
+        except Exception as e:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析腾讯K线失败: {e}")
+            return pd.DataFrame()
+    
+    def _search_eastmoney(self, keyword):
+        """东方财富搜索接口，请求失败返回None，没有结果返回空列表"""
+        results = []
+        try:
+            url = f"https://searchapi.eastmoney.com/api/suggest/get?input={keyword}&type=14&token=D43BF722C8E33BDC906FB84D85E326E8"
+            response = self.http.get('eastmoney', url)
+        
+            if response.status_code != 200:
+                return None
+            data = response.json()
+            for item in data.get('QuotationCodeTable', {}).get('Data') or []:
+                code = item.get('Code', '')
+                ts_code = self._suggest_ts_code(item)
+                if not ts_code:
+                    # 跳过沪深北以外的市场（港股、美股等）
+                    continue
+                
+                # 创建股票数据记录
+                stock_data = {
+                    'ts_code': ts_code,
+                    'symbol': code,
+                    'name': item.get('Name', ''),
+                    'area': '',
+                    'industry': item.get('QuotationCodeTableMarket', {}).get('Name', ''),
+                    'list_date': ''
+                }
             
+                results.append(stock_data)
+        except requests.RequestException as e:
+            print(f"搜索股票失败: {e}")
+            return None
+        except Exception as e:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析东方财富搜索结果失败: {e}")
+            return []
+        return results
+    
+    def _suggest_ts_code(self, item):
+        """东方财富搜索结果对应的完整代码，不是沪深北市场时返回None
+
+        按市场编号 MktNum 判断（1沪市，0深市和北交所），没有市场编号时按代码前缀判断。
+        """
+        code = item.get('Code', '')
+        if not code.isdigit():
+            return None
+        market = item.get('MktNum')
+        if market is not None:
+            market = str(market)
+        if market in (None, '0') and (code.startswith(BJ_PREFIXES) or item.get('SecurityTypeName', '').startswith('京')):
+            return f"{code}.BJ"
+        if market == '1' or (market is None and code.startswith('6')):
+            return f"{code}.SH"
+        if market == '0' or (market is None and code.startswith(('0', '3'))):
+            return f"{code}.SZ"
         return None
+    
+    def fill_prices(self, results):
+        """为搜索结果补充当前价格，所有结果只发一次批量请求
         
+        search_stocks 不再等待价格，由界面在显示结果后调用。返回 {ts_code: (价格, 价格精度)}
+        """
+        missing = [stock['ts_code'] for stock in results if not stock.get('current_price')]
+        quotes = {}
+        if missing:
+            try:
+                quotes = self.get_realtime_quotes(missing)
+            except Exception as e:
+                print(f"获取搜索结果价格失败: {e}")
+        for stock_data in results:
+            current_price, price_precision = quotes.get(stock_data['ts_code'], (None, 2))
+            if current_price:
+                stock_data['current_price'] = current_price
+                stock_data['price_precision'] = price_precision
+        return {stock['ts_code']: (stock['current_price'], stock.get('price_precision', 2))
+                for stock in results if stock.get('current_price')}
+    
     def search_stocks(self, keyword):
-        """搜索股票"""
-        results = []
+        """搜索股票，只返回代码和名称等信息，价格通过 fill_prices 单独获取"""
+        # 优先在本地证券代码表中搜索
+        results = self.instrument_master.search(keyword)
         
-        # 使用东方财富搜索接口
+        # 代码表中没有时使用东方财富搜索接口
+        if not results:
+            results = self._tracked('eastmoney', 'search', self._search_eastmoney, keyword) or []
+        
+        # 如果代码表和东方财富都没有结果，对于数字尝试按代码使用新浪API查找
+        # 按名称查找需要更复杂的逻辑，暂不实现
+        if not results and keyword.isdigit():
+            results = self._tracked('sina', 'search', self._search_sina, keyword) or []
+        return results
+    
+    def _search_sina(self, keyword):
+        """新浪行情接口按代码查找股票，请求失败返回None"""
+        results = []
         try:
-            url = f"https://searchapi.eastmoney.com/api/suggest/get?input={keyword}&type=14&token=D43BF722C8E33BDC906FB84D85E326E8"
-            response = requests.get(url)
+            # 沪市和深市合并为一次请求，行情行中已包含价格
+            url = f"http://hq.sinajs.cn/list=sh{keyword},sz{keyword}"
+            response = self.http.get('sina', url)
             
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('QuotationCodeTable', {}).get('Data'):
-                    for item in data['QuotationCodeTable']['Data']:
-                        code = item.get('Code', '')
-                        if not code:
-                            continue
-                            
-                        # 处理深市和沪市代码
-                        if code.startswith('6'):
-                            ts_code = f"{code}.SH"
-                        elif code.startswith('0') or code.startswith('3'):
-                            ts_code = f"{code}.SZ"
-                        else:
-                            # 跳过非常规股票代码
-                            continue
-                            
-                        # 创建股票数据记录
-                        stock_data = {
-                            'ts_code': ts_code,
-                            'symbol': code,
-                            'name': item.get('Name', ''),
-                            'area': '',
-                            'industry': item.get('QuotationCodeTableMarket', {}).get('Name', ''),
-                            'list_date': ''
-                        }
-                        
-                        # 尝试获取当前价格
-                        try:
-                            current_price, price_precision = self.get_realtime_price(ts_code)
-                            if current_price:
-                                stock_data['current_price'] = current_price
-                                stock_data['price_precision'] = price_precision
-                        except Exception as e:
-                            print(f"获取{ts_code}价格错误: {e}")
-                            
-                        results.append(stock_data)
+            if response.status_code != 200:
+                return None
+            for quote in parse_sina(response.content, with_name=True):
+                if quote.name:  # 如果名称不为空，说明找到了股票
+                    market = quote.code[:2]
+                    ts_code = f"{keyword}.{'SH' if market == 'sh' else 'SZ'}"
+                    record = {
+                        'ts_code': ts_code,
+                        'symbol': keyword,
+                        'name': quote.name,
+                        'area': '',
+                        'industry': '',
+                        'list_date': ''
+                    }
+                    if quote.price > 0:
+                        record['current_price'] = quote.price
+                        record['price_precision'] = quote.precision
+                    
+                    results.append(record)
+        except requests.RequestException as e:
+            print(f"通过新浪API搜索股票失败: {e}")
+            return None
         except Exception as e:
-            print(f"搜索股票失败: {e}")
-            
-        # 如果东方财富没有结果，尝试使用新浪API
-        if not results:
+            # 响应格式不符合预期，不计为行情源失败
+            print(f"解析新浪搜索结果失败: {e}")
+            return []
+        return results
+
+Tick = namedtuple('Tick', ['stock_code', 'price', 'precision', 'prev_price', 'time', 'volume'],
+                  defaults=[None])
+
+
+class QuoteSubscription:
+    """一个消费者对若干股票的订阅
+
+    指定 callback 时在拉取行情的线程中直接回调，否则事件放入队列，
+    通过迭代订阅对象（生成器）逐个取出。
+    """
+
+    def __init__(self, stream, stock_codes, callback=None):
+        self.stream = stream
+        self.stock_codes = set(stock_codes)
+        self.callback = callback
+        self.queue = queue.Queue()
+        self.closed = False
+
+    def set_symbols(self, stock_codes):
+        """替换订阅的股票，新增的股票立即收到最近一次价格"""
+        added = set(stock_codes) - self.stock_codes
+        self.stock_codes = set(stock_codes)
+        self.stream._send_snapshot(self, added)
+
+    def deliver(self, ticks):
+        ticks = [tick for tick in ticks if tick.stock_code in self.stock_codes]
+        if not ticks or self.closed:
+            return
+        if self.callback:
+            self.callback(ticks)
+        else:
+            for tick in ticks:
+                self.queue.put(tick)
+
+    def events(self, timeout=None):
+        """逐个产生价格变化事件，timeout 秒内没有新事件时结束"""
+        while not self.closed:
             try:
-                # 对于数字，假设是股票代码
-                if keyword.isdigit():
-                    # 尝试沪市和深市
-                    for market in ['sh', 'sz']:
-                        url = f"http://hq.sinajs.cn/list={market}{keyword}"
-                        headers = {"Referer": "https://finance.sina.com.cn"}
-                        response = requests.get(url, headers=headers)
-                        
-                        if response.status_code == 200:
-                            content = response.text
-                            matches = re.findall(r'hq_str_(?:\w+)=\"([^\"]+)\"', content)
-                            if matches and len(matches[0].split(',')) > 1:
-                                data = matches[0].split(',')
-                                name = data[0]
-                                if name:  # 如果名称不为空，说明找到了股票
-                                    ts_code = f"{keyword}.{'SH' if market == 'sh' else 'SZ'}"
-                                    current_price, price_precision = self.get_realtime_price(ts_code)
-                                    
-                                    record = {
-                                        'ts_code': ts_code,
-                                        'symbol': keyword,
-                                        'name': name,
-                                        'area': '',
-                                        'industry': '',
-                                        'list_date': ''
-                                    }
-                                    if current_price:
-                                        record['current_price'] = current_price
-                                        record['price_precision'] = price_precision
-                                    
-                                    results.append(record)
-                # 对于非数字，假设是股票名称
-                else:
-                    # 这里需要更复杂的逻辑来通过名称查找，暂不实现
-                    pass
-            except Exception as e:
-                print(f"通过新浪API搜索股票失败: {e}")
-                    
-        return results 
\ No newline at end of file
+                tick = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                return
+            if tick is None:
+                return
+            yield tick
+
+    def __iter__(self):
+        return self.events()
+
+    def close(self):
+        self.stream.unsubscribe(self)
+        self.closed = True
+        self.queue.put(None)
+
+
+class QuoteStream:
+    """行情订阅分发
+
+    消费者（价格提醒、主表、行情记录等）按股票订阅，每轮只对所有订阅股票的并集
+    发一次批量请求，价格与上一次不同时才向订阅了该股票的消费者推送事件。
+    """
+
+    def __init__(self, stock_service):
+        self.stock_service = stock_service
+        self.last_quotes = {}  # 股票代码 -> Tick
+        self._subscriptions = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, stock_codes=(), callback=None):
+        """订阅股票，已有价格的股票立即收到一次最近价格"""
+        subscription = QuoteSubscription(self, stock_codes, callback)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        self._send_snapshot(subscription, subscription.stock_codes)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def symbols(self):
+        """所有订阅股票的并集"""
+        with self._lock:
+            return set().union(*(s.stock_codes for s in self._subscriptions))
+
+    def poll(self, stock_codes=None):
+        """拉取一轮行情，stock_codes 为空时拉取全部订阅股票
+
+        价格有变化的股票通过订阅推送事件，返回本轮拿到价格的 {股票代码: (价格, 价格精度)}。
+        """
+        codes = self.symbols()
+        if stock_codes is not None:
+            codes &= set(stock_codes)
+        if not codes:
+            return {}
+        quotes = {code: quote for code, quote in self.stock_service.get_realtime_quotes(sorted(codes)).items()
+                  if quote[0]}
+        self.publish(quotes)
+        return quotes
+
+    def publish(self, quotes, volumes=None):
+        """发布行情 {股票代码: (价格, 价格精度)}，只推送价格有变化的股票
+
+        volumes 为 {股票代码: 累计成交量}，未指定时使用批量行情中记录的成交量。
+        """
+        if volumes is None:
+            volumes = self.stock_service.last_volumes
+        now = datetime.now()
+        ticks = []
+        with self._lock:
+            for code, (price, precision) in quotes.items():
+                if not price:
+                    continue
+                last = self.last_quotes.get(code)
+                if last is not None and last.price == price:
+                    continue
+                tick = Tick(code, price, precision, last.price if last else None, now, volumes.get(code))
+                self.last_quotes[code] = tick
+                ticks.append(tick)
+            subscriptions = list(self._subscriptions)
+        if ticks:
+            for subscription in subscriptions:
+                subscription.deliver(ticks)
+        return ticks
+
+    def _send_snapshot(self, subscription, stock_codes):
+        with self._lock:
+            ticks = [self.last_quotes[code] for code in stock_codes if code in self.last_quotes]
+        if ticks:
+            subscription.deliver(ticks)
@@ -0,0 +1,218 @@
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+from datetime import datetime, date
+
+import numpy as np
+
+# 每条记录定长：时间（Unix 微秒）、股票编号、价格、累计成交量（股，未知时为 NaN）
+TICK_DTYPE = np.dtype([('ts', '<i8'), ('symbol', '<u4'), ('price', '<f8'), ('volume', '<f8')])
+
+# 文件头：魔数、记录长度、记录数；记录数在写完一批记录后更新，读取方只读取已完成的记录
+MAGIC = b'TICKREC1'
+HEADER = struct.Struct('<8sIIQ')  # 魔数, 记录长度, 保留, 记录数
+HEADER_SIZE = 64
+COUNT_OFFSET = 16
+INITIAL_CAPACITY = 65536
+
+
+class _DayFile:
+    """一天的行情记录文件，容量不足时扩大一倍后重新映射"""
+
+    def __init__(self, path):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE
+        self.file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            magic, size, _, self.count = HEADER.unpack_from(self.file.read(HEADER.size))
+            if magic != MAGIC or size != TICK_DTYPE.itemsize:
+                self.file.close()
+                raise ValueError(f"{path} 不是行情记录文件")
+            capacity = (os.path.getsize(path) - HEADER_SIZE) // TICK_DTYPE.itemsize
+        else:
+            self.count = 0
+            capacity = INITIAL_CAPACITY
+            self.file.truncate(HEADER_SIZE + capacity * TICK_DTYPE.itemsize)
+        self._map(capacity)
+        if not exists:
+            HEADER.pack_into(self.mm, 0, MAGIC, TICK_DTYPE.itemsize, 0, 0)
+
+    def _map(self, capacity):
+        self.capacity = capacity
+        self.mm = mmap.mmap(self.file.fileno(), HEADER_SIZE + capacity * TICK_DTYPE.itemsize)
+        self.records = np.frombuffer(self.mm, dtype=TICK_DTYPE, count=capacity, offset=HEADER_SIZE)
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        # 释放对映射的引用后才能关闭
+        self.records = None
+        self.mm.flush()
+        self.mm.close()
+        self.file.truncate(HEADER_SIZE + capacity * TICK_DTYPE.itemsize)
+        self._map(capacity)
+
+    def append(self, rows):
+        end = self.count + len(rows)
+        if end > self.capacity:
+            self._grow(end)
+        self.records[self.count:end] = rows
+        self.count = end
+        struct.pack_into('<Q', self.mm, COUNT_OFFSET, end)
+
+    def close(self):
+        self.records = None
+        self.mm.flush()
+        self.mm.close()
+        self.file.close()
+
+
+class TickRecorder:
+    """把每个行情事件追加到按天划分的定长二进制文件
+
+    行情回调只把事件放入队列，由后台线程批量写入内存映射文件，不阻塞拉取行情的线程。
+    股票代码映射为编号保存在 symbols.json 中，所有日期共用。读取时直接映射文件，
+    返回不复制数据的 NumPy 结构化数组，可作为分时图和盘后分析的数据源。
+    """
+
+    def __init__(self, directory='tick_data'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.symbols_path = os.path.join(directory, 'symbols.json')
+        self._symbols = self._load_symbols()
+        self._codes = {symbol_id: code for code, symbol_id in self._symbols.items()}
+        self._last = {}  # 股票代码 -> 最近记录的行情时间，跳过订阅时重复推送的快照
+        self._symbols_changed = False
+        self._queue = queue.Queue()
+        self._files = {}  # 日期 -> _DayFile
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _load_symbols(self):
+        try:
+            with open(self.symbols_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_symbols(self):
+        tmp_path = self.symbols_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._symbols, f, ensure_ascii=False)
+        os.replace(tmp_path, self.symbols_path)
+
+    def path_for(self, day):
+        return os.path.join(self.directory, f"{day.strftime('%Y%m%d')}.tick")
+
+    # 写入
+
+    def record(self, ticks):
+        """QuoteStream 订阅回调，在拉取行情的线程中调用"""
+        self._ensure_thread()
+        self._queue.put(ticks)
+
+    def flush(self, timeout=None):
+        """等待已收到的行情全部写入文件"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5):
+        self.flush(timeout)
+        with self._lock:
+            for day_file in self._files.values():
+                day_file.close()
+            self._files = {}
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='tick-recorder', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # 把排队的事件合并成一批写入
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            ticks = [tick for item in batch if not isinstance(item, threading.Event) for tick in item]
+            if ticks:
+                try:
+                    self._write(ticks)
+                except Exception as e:
+                    print(f"写入行情记录失败: {e}")
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _symbol_id(self, code):
+        symbol_id = self._symbols.get(code)
+        if symbol_id is None:
+            symbol_id = self._symbols[code] = len(self._symbols)
+            self._codes[symbol_id] = code
+            self._symbols_changed = True
+        return symbol_id
+
+    def _write(self, ticks):
+        self._symbols_changed = False
+        days = {}
+        for tick in ticks:
+            if self._last.get(tick.stock_code) == tick.time:
+                continue
+            self._last[tick.stock_code] = tick.time
+            volume = tick.volume if tick.volume is not None else np.nan
+            days.setdefault(tick.time.date(), []).append(
+                (int(tick.time.timestamp() * 1_000_000), self._symbol_id(tick.stock_code), tick.price, volume))
+        if self._symbols_changed:
+            self._save_symbols()
+        with self._lock:
+            for day, rows in days.items():
+                day_file = self._files.get(day)
+                if day_file is None:
+                    # 换日后关闭前一天的文件
+                    for old_day in [d for d in self._files if d < day]:
+                        self._files.pop(old_day).close()
+                    day_file = self._files[day] = _DayFile(self.path_for(day))
+                day_file.append(np.array(rows, dtype=TICK_DTYPE))
+
+    # 读取
+
+    def symbol_id(self, code):
+        return self._symbols.get(code)
+
+    def symbol_code(self, symbol_id):
+        return self._codes.get(symbol_id)
+
+    def read_day(self, day=None):
+        """某天的全部行情记录，只读映射文件，不复制数据"""
+        path = self.path_for(day or date.today())
+        if not os.path.exists(path):
+            return np.empty(0, dtype=TICK_DTYPE)
+        with open(path, 'rb') as f:
+            magic, size, _, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or size != TICK_DTYPE.itemsize:
+            raise ValueError(f"{path} 不是行情记录文件")
+        if count == 0:
+            return np.empty(0, dtype=TICK_DTYPE)
+        return np.memmap(path, dtype=TICK_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+    def intraday(self, code, day=None):
+        """某支股票某天的分时数据，返回 (时间 datetime64[us], 价格, 累计成交量)"""
+        symbol_id = self.symbol_id(code)
+        records = self.read_day(day)
+        if symbol_id is None or len(records) == 0:
+            return (np.empty(0, dtype='datetime64[us]'), np.empty(0), np.empty(0))
+        rows = records[records['symbol'] == symbol_id]
+        # 记录中的时间为 UTC 微秒，转换为本地时间显示
+        offset = int(datetime.now().astimezone().utcoffset().total_seconds() * 1_000_000)
+        return ((rows['ts'] + offset).astype('datetime64[us]'), rows['price'], rows['volume'])
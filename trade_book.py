@@ -0,0 +1,142 @@
+import threading
+
+from sqlalchemy import event
+
+from models import Session, Trade
+
+_CHANGES = 'trade_book_changes'  # session.info 中记录已写入、待提交的交易变化
+_RELOAD = 'trade_book_reload'    # session.info 中记录是否执行了批量删除或更新
+
+
+class TradeRecord:
+    """监控和主表显示需要的交易字段"""
+    __slots__ = ('id', 'stock_code', 'stock_name', 'buy_price', 'buy_time',
+                 'sell_target', 'buy_target', 'price_precision', 'is_active')
+
+    FIELDS = __slots__
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_trade(cls, trade):
+        return cls(*(getattr(trade, name) for name in cls.FIELDS))
+
+
+class TradeBook:
+    """内存中的活跃交易表
+
+    只保存活跃交易的 TradeRecord，不持有 ORM 对象。启动时从数据库读入，之后通过会话事件同步：
+    每次 flush 记录新增、修改、删除的交易，提交后更新，回滚则丢弃。
+    批量删除或更新（如恢复数据）提交后整体重新读入；绕过 ORM 直接执行的 SQL 需要调用 load。
+    读入失败时 loaded 为 False，调用方应改为直接查询数据库。
+    subscribe 注册的回调在每次变化后收到变化的交易，提醒索引等据此增量更新。
+    """
+
+    def __init__(self, session_factory=Session):
+        self.session_factory = session_factory
+        self._records = {}  # 交易ID -> TradeRecord
+        self.loaded = False
+        self._listeners = []
+        self._lock = threading.Lock()
+        event.listen(session_factory, 'after_flush', self._after_flush)
+        event.listen(session_factory, 'after_bulk_delete', self._after_bulk)
+        event.listen(session_factory, 'after_bulk_update', self._after_bulk)
+        event.listen(session_factory, 'after_commit', self._after_commit)
+        event.listen(session_factory, 'after_rollback', self._after_rollback)
+        self.load()
+
+    def close(self):
+        event.remove(self.session_factory, 'after_flush', self._after_flush)
+        event.remove(self.session_factory, 'after_bulk_delete', self._after_bulk)
+        event.remove(self.session_factory, 'after_bulk_update', self._after_bulk)
+        event.remove(self.session_factory, 'after_commit', self._after_commit)
+        event.remove(self.session_factory, 'after_rollback', self._after_rollback)
+
+    def load(self):
+        """从数据库重新读入所有活跃交易"""
+        columns = [getattr(Trade, name) for name in TradeRecord.FIELDS]
+        session = self.session_factory()
+        try:
+            rows = session.query(*columns).filter(Trade.is_active == True).all()  # noqa: E712
+        except Exception as e:
+            print(f"加载交易记录失败: {e}")
+            self.loaded = False
+            return
+        finally:
+            session.close()
+        with self._lock:
+            self._records = {row[0]: TradeRecord(*row) for row in rows}
+            records = dict(self._records)
+        self.loaded = True
+        self._notify(records, True)
+
+    def subscribe(self, callback):
+        """交易变化时回调 callback(changes, reloaded)
+
+        changes 为 {交易ID: TradeRecord}，关闭或删除的交易为 None；reloaded 为真时整体重新读入，
+        changes 为全部活跃交易。回调在提交事务的线程中执行。
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, changes, reloaded):
+        for callback in self._listeners:
+            callback(changes, reloaded)
+
+    def _after_flush(self, session, flush_context):
+        changes = session.info.setdefault(_CHANGES, {})
+        for obj in session.new | session.dirty:
+            if isinstance(obj, Trade):
+                changes[obj.id] = TradeRecord.from_trade(obj)
+        for obj in session.deleted:
+            if isinstance(obj, Trade):
+                changes[obj.id] = None
+
+    def _after_bulk(self, delete_context):
+        delete_context.session.info[_RELOAD] = True
+
+    def _after_commit(self, session):
+        changes = session.info.pop(_CHANGES, None)
+        if session.info.pop(_RELOAD, False):
+            self.load()
+            return
+        if not changes:
+            return
+        changes = {trade_id: record if record is not None and record.is_active else None
+                   for trade_id, record in changes.items()}
+        with self._lock:
+            for trade_id, record in changes.items():
+                if record is not None:
+                    self._records[trade_id] = record
+                else:
+                    self._records.pop(trade_id, None)
+        self._notify(changes, False)
+
+    def _after_rollback(self, session):
+        session.info.pop(_CHANGES, None)
+        session.info.pop(_RELOAD, None)
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, trade_id):
+        return self._records.get(trade_id)
+
+    def records(self):
+        """所有活跃交易，按交易ID排序"""
+        with self._lock:
+            return [self._records[trade_id] for trade_id in sorted(self._records)]
+
+    def symbols(self):
+        with self._lock:
+            return {record.stock_code for record in self._records.values()}
+
+    def lowest(self):
+        """每支股票买入价最低的活跃交易，与 models.lowest_active_trades 的选择和顺序相同"""
+        best = {}
+        for record in self.records():
+            current = best.get(record.stock_code)
+            if current is None or record.buy_price < current.buy_price:
+                best[record.stock_code] = record
+        return list(best.values())
@@ -0,0 +1,250 @@
+import glob
+import json
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+
+from models import Session, Trade
+
+# 记入账本的交易字段；卖出、买入目标由这些字段计算得出，不单独记录
+LEDGER_FIELDS = ('stock_code', 'stock_name', 'buy_price', 'buy_time',
+                 'sell_condition', 'buy_step', 'price_precision', 'is_active')
+
+_EVENTS = 'trade_ledger_events'  # session.info 中记录已写入、待提交的事件
+
+
+def _encode(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _apply(state, item):
+    """把一条事件应用到 {交易ID: 字段} 上"""
+    trade_id = str(item['id'])
+    if item['type'] == 'delete':
+        state.pop(trade_id, None)
+    else:
+        state.setdefault(trade_id, {}).update(item['fields'])
+
+
+def replay(snapshot, events):
+    """在快照上按序号重放快照之后的事件，返回 {交易ID: 字段}"""
+    state = {trade_id: dict(fields) for trade_id, fields in snapshot['trades'].items()}
+    for item in sorted(events, key=lambda item: item['seq']):
+        if item['seq'] > snapshot['seq']:
+            _apply(state, item)
+    return state
+
+
+class TradeLedger:
+    """只追加的交易事件账本
+
+    交易的创建(create)、修改(update)、关闭(close)、删除(delete)按提交顺序追加到 events.jsonl，
+    每条事件带递增序号和时间。每追加 snapshot_every 条事件写一个快照，记录当时所有交易的字段
+    和事件文件的位置：当前状态由最新快照加上之后的少量事件得到，任意历史时刻的状态从该时刻
+    之前最近的快照开始重放。第一次备份上传最新快照，之后只需上传上次备份之后的新事件，
+    恢复时用 replay 在快照上重放各次备份的事件。
+    事件通过会话事件自动记录，提交后写入，回滚则丢弃。
+    """
+
+    def __init__(self, directory='trade_ledger', session_factory=Session, snapshot_every=500):
+        self.directory = directory
+        self.session_factory = session_factory
+        self.snapshot_every = snapshot_every
+        self.events_path = os.path.join(directory, 'events.jsonl')
+        self.backup_path = os.path.join(directory, 'backup_state.json')
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._state, self._seq, self._offset, self._snapshot_seq = self._load_current()
+        if self._seq == 0 and not self._snapshots():
+            self._bootstrap()
+        event.listen(session_factory, 'after_flush', self._after_flush)
+        event.listen(session_factory, 'after_commit', self._after_commit)
+        event.listen(session_factory, 'after_rollback', self._after_rollback)
+
+    def close(self):
+        event.remove(self.session_factory, 'after_flush', self._after_flush)
+        event.remove(self.session_factory, 'after_commit', self._after_commit)
+        event.remove(self.session_factory, 'after_rollback', self._after_rollback)
+
+    @property
+    def seq(self):
+        """最后一条事件的序号"""
+        return self._seq
+
+    # 快照
+
+    def _snapshots(self):
+        """所有快照 [(序号, 路径)]，按序号排序"""
+        paths = glob.glob(os.path.join(self.directory, 'snapshot_*.json'))
+        return sorted((int(os.path.basename(path)[9:-5]), path) for path in paths)
+
+    def _read_snapshot(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def latest_snapshot(self):
+        """最新的快照，没有快照时返回None"""
+        snapshots = self._snapshots()
+        return self._read_snapshot(snapshots[-1][1]) if snapshots else None
+
+    def _write_snapshot(self):
+        snapshot = {'seq': self._seq, 'time': datetime.now().isoformat(),
+                    'offset': self._offset, 'trades': self._state}
+        path = os.path.join(self.directory, f'snapshot_{self._seq:010d}.json')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._snapshot_seq = self._seq
+
+    def _bootstrap(self):
+        """账本为空时，以数据库中的现有交易作为第一个快照"""
+        session = self.session_factory()
+        try:
+            trades = session.query(Trade).all()
+            self._state = {str(t.id): {name: _encode(getattr(t, name)) for name in LEDGER_FIELDS}
+                           for t in trades}
+        except Exception as e:
+            print(f"初始化交易账本失败: {e}")
+            return
+        finally:
+            session.close()
+        self._write_snapshot()
+
+    # 读取
+
+    def _read_events(self, offset, stop=None):
+        """从文件位置 offset 开始读取事件，返回 [(事件, 读完该事件后的位置)]，stop(事件) 为真时停止"""
+        if not os.path.exists(self.events_path):
+            return []
+        result = []
+        with open(self.events_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                if not line.endswith(b'\n'):
+                    break  # 写入中断留下的不完整行
+                item = json.loads(line)
+                if stop and stop(item):
+                    break
+                result.append((item, offset))
+        return result
+
+    def _load_current(self):
+        snapshots = self._snapshots()
+        if snapshots:
+            snapshot = self._read_snapshot(snapshots[-1][1])
+            state, seq, offset = snapshot['trades'], snapshot['seq'], snapshot['offset']
+        else:
+            state, seq, offset = {}, 0, 0
+        snapshot_seq = seq
+        for item, end in self._read_events(offset):
+            _apply(state, item)
+            seq, offset = item['seq'], end
+        return state, seq, offset, snapshot_seq
+
+    def state(self):
+        """当前所有交易 {交易ID: 字段}，包含已关闭的交易"""
+        with self._lock:
+            return {trade_id: dict(fields) for trade_id, fields in self._state.items()}
+
+    def state_at(self, when):
+        """重建 when 时刻所有交易的字段"""
+        when = when.isoformat()
+        base = None
+        for _, path in reversed(self._snapshots()):
+            snapshot = self._read_snapshot(path)
+            if snapshot['time'] <= when:
+                base = snapshot
+                break
+        state = base['trades'] if base else {}
+        for item, _ in self._read_events(base['offset'] if base else 0,
+                                         stop=lambda item: item['time'] > when):
+            _apply(state, item)
+        return state
+
+    def events_since(self, seq):
+        """序号大于 seq 的所有事件"""
+        offset = 0
+        for snapshot_seq, path in reversed(self._snapshots()):
+            if snapshot_seq <= seq:
+                offset = self._read_snapshot(path)['offset']
+                break
+        return [item for item, _ in self._read_events(offset) if item['seq'] > seq]
+
+    # 增量备份
+
+    def backed_up_seq(self):
+        """已备份的最后一条事件序号，还没有备份过时返回None"""
+        try:
+            with open(self.backup_path, 'r', encoding='utf-8') as f:
+                return json.load(f)['seq']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def mark_backed_up(self, seq):
+        with open(self.backup_path, 'w', encoding='utf-8') as f:
+            json.dump({'seq': seq, 'time': datetime.now().isoformat()}, f)
+
+    # 记录
+
+    def _after_flush(self, session, flush_context):
+        pending = session.info.setdefault(_EVENTS, [])
+        for obj in session.new:
+            if isinstance(obj, Trade):
+                pending.append(('create', obj.id, {name: _encode(getattr(obj, name)) for name in LEDGER_FIELDS}))
+        for obj in session.dirty:
+            if not isinstance(obj, Trade):
+                continue
+            attrs = inspect(obj).attrs
+            fields = {name: _encode(getattr(obj, name)) for name in LEDGER_FIELDS
+                      if attrs[name].history.has_changes()}
+            if fields:
+                kind = 'close' if fields.get('is_active') is False else 'update'
+                pending.append((kind, obj.id, fields))
+        for obj in session.deleted:
+            if isinstance(obj, Trade):
+                pending.append(('delete', obj.id, {}))
+
+    def _after_commit(self, session):
+        pending = session.info.pop(_EVENTS, None)
+        if pending:
+            self.append(pending)
+
+    def _after_rollback(self, session):
+        session.info.pop(_EVENTS, None)
+
+    def append(self, pending):
+        """追加事件 [(类型, 交易ID, 字段)]"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            # 先写入文件，写入成功后再更新内存中的序号和状态
+            seq = self._seq
+            items = []
+            for kind, trade_id, fields in pending:
+                seq += 1
+                items.append({'seq': seq, 'time': now, 'type': kind, 'id': trade_id, 'fields': fields})
+            data = ''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in items).encode('utf-8')
+            try:
+                with open(self.events_path, 'ab') as f:
+                    try:
+                        f.write(data)
+                        f.flush()
+                    except OSError:
+                        # 去掉写了一半的内容，下次从同一位置追加
+                        f.truncate(self._offset)
+                        raise
+            except OSError as e:
+                print(f"写入交易账本失败: {e}")
+                return
+            self._seq = seq
+            for item in items:
+                _apply(self._state, item)
+            self._offset += len(data)
+            if self._seq - self._snapshot_seq >= self.snapshot_every:
+                try:
+                    self._write_snapshot()
+                except OSError as e:
+                    print(f"写入交易账本快照失败: {e}")
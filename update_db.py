@@ -1,24 +1,21 @@
-import sqlite3
+from models import get_engine
+from migrations import migrate, check_index_usage
 
 def update_database():
-    """更新数据库结构，添加price_precision字段"""
-    conn = sqlite3.connect('trades.db')
-    cursor = conn.cursor()
+    """把数据库结构升级到最新版本，并检查常用查询是否使用了索引"""
+    # 第一次连接数据库时已自动升级，这里再执行一次以显示结果
+    engine = get_engine()
+    version = migrate(engine)
+    print(f"数据库结构版本: {version}")
     
-    # 检查price_precision字段是否存在
-    cursor.execute("PRAGMA table_info(trades)")
-    columns = cursor.fetchall()
-    column_names = [column[1] for column in columns]
-    
-    if 'price_precision' not in column_names:
-        print("添加price_precision字段...")
-        cursor.execute("ALTER TABLE trades ADD COLUMN price_precision INTEGER DEFAULT 2")
-        conn.commit()
-        print("数据库更新成功!")
+    problems = check_index_usage(engine)
+    if problems:
+        for sql, index, plan in problems:
+            print(f"查询未使用索引 {index}: {sql}")
+            for detail in plan:
+                print(f"    {detail}")
     else:
-        print("price_precision字段已存在，无需更新。")
-    
-    conn.close()
+        print("常用查询均已使用索引。")
 
 if __name__ == "__main__":
-    update_database() 
\ No newline at end of file
+    update_database() 